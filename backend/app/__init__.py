@@ -32,6 +32,10 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Validate uploaded files while they stream in
+    from app.utils.upload_validation import UploadRequest
+    app.request_class = UploadRequest
+    
     # Initialize extensions with app
     db.init_app(app)
     migrate.init_app(app, db)
@@ -65,6 +69,8 @@ def create_app(config_name='default'):
     from app.routes.chat import chat_bp
     from app.routes.reels import reels_bp
     from app.routes.admin import admin_bp
+    from app.routes.uploads import uploads_bp
+    from app.routes.media import media_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -74,6 +80,8 @@ def create_app(config_name='default'):
     app.register_blueprint(chat_bp, url_prefix='/chat')
     app.register_blueprint(reels_bp, url_prefix='/reels')
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(uploads_bp, url_prefix='/uploads')
+    app.register_blueprint(media_bp, url_prefix='/media')
     
     # Set up Flask-Security
     from app.models.user import User, Role
@@ -83,6 +91,18 @@ def create_app(config_name='default'):
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    from app.utils.commands import register_commands
+    register_commands(app)
+    
+    # Collect orphaned uploads in the background (when enabled)
+    from app.utils.upload_gc import register_upload_gc
+    register_upload_gc(app)
+    
+    # Roll up daily admin stats in the background (when enabled)
+    from app.utils.rollups import register_rollup_job
+    register_rollup_job(app)
+    
     # Register socket event handlers
     from app.routes.events import register_socket_events
     register_socket_events(socketio)
@@ -94,6 +114,14 @@ def register_error_handlers(app):
     def not_found(error):
         return {"error": "Not found"}, 404
     
+    @app.errorhandler(413)
+    def too_large(error):
+        return {"error": "File too large"}, 413
+    
+    @app.errorhandler(415)
+    def unsupported_media_type(error):
+        return {"error": "File type not allowed"}, 415
+    
     @app.errorhandler(500)
     def server_error(error):
         return {"error": "Server error"}, 500
@@ -1,5 +1,10 @@
 from app.models.user import User, Role, UserPreference, UserInterest, UserBlocked, UserLike, Verification
 from app.models.match import Match
-from app.models.message import Message, ChatAttachment
-from app.models.media import Media, Comment, Like, Report
+from app.models.message import Message, ChatAttachment, MessageArchiveSegment
+from app.models.media import Media, Comment, Like, Report, Hashtag, MediaHashtag, TrendingScore, MediaCounterShard
 from app.models.subscription import Subscription, Transaction
+from app.models.upload import UploadSession
+from app.models.storage import StoredFile
+from app.models.notification import Notification, NotificationCounter
+from app.models.moderation import ImageFingerprint
+from app.models.stats import DailyStats
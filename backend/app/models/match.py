@@ -11,6 +11,7 @@ class Match(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Define unique constraint to prevent duplicate matches
     __table_args__ = (
@@ -36,12 +37,20 @@ class Match(db.Model):
         self.last_activity = datetime.utcnow()
         db.session.commit()
     
-    def to_dict(self, current_user_id):
-        """Convert match to dictionary for API responses"""
-        other_user = self.user2 if self.user1_id == current_user_id else self.user1
+    def to_dict(self, current_user_id, other_user=None, last_messages=None):
+        """Convert match to dictionary for API responses.
+        
+        Pages pass the other users and the {match_id: last message} map loaded for the
+        whole page to avoid per-item queries.
+        """
+        if other_user is None:
+            other_user = self.user2 if self.user1_id == current_user_id else self.user1
         
         # Get the last message in this match if any
-        last_message = self.messages.order_by(Message.created_at.desc()).first()
+        if last_messages is not None:
+            last_message = last_messages.get(self.id)
+        else:
+            last_message = self.messages.order_by(Message.created_at.desc()).first()
         
         return {
             'id': self.id,
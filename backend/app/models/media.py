@@ -1,4 +1,6 @@
 from datetime import datetime
+import json
+from sqlalchemy import orm
 from app import db
 
 class Media(db.Model):
@@ -24,8 +26,15 @@ class Media(db.Model):
     is_private = db.Column(db.Boolean, default=False)
     is_featured = db.Column(db.Boolean, default=False)
     
-    # Metrics
+    # Background processing (see app.utils.media_processing)
+    processing_status = db.Column(db.String(20), default='pending')  # 'pending', 'processing', 'ready', 'failed'
+    variants = db.Column(db.Text)  # JSON {name: {path, width, height, size, hash}} of resized renditions
+    content_hash = db.Column(db.String(64))  # SHA-256 of the original, versions its delivery URL
+    
+    # Metrics (maintained with atomic increments, see app.utils.counters)
     view_count = db.Column(db.Integer, default=0)
+    like_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -39,10 +48,16 @@ class Media(db.Model):
     # Tags
     hashtags = db.Column(db.String(255))
     
-    def increment_view(self):
-        """Increment the view count"""
-        self.view_count += 1
-        db.session.commit()
+    # Feeds page through media newest first with (created_at, id) cursors
+    __table_args__ = (
+        db.Index('ix_media_feed', 'media_type', 'created_at', 'id'),
+    )
+    
+    def increment_view(self, viewer_id=None):
+        """Count a view; views are buffered and flushed to view_count in batches"""
+        from app.utils.views import record_view
+        
+        return record_view(self.id, viewer_id)
     
     def get_hashtags_list(self):
         """Get hashtags as a list"""
@@ -50,24 +65,56 @@ class Media(db.Model):
             return self.hashtags.split(',')
         return []
     
+    def get_variants(self):
+        """Get resized renditions as a dict, each with its versioned delivery URL"""
+        from app.utils.media_delivery import media_url
+        
+        if not self.variants:
+            return {}
+        
+        variants = json.loads(self.variants)
+        for variant in variants.values():
+            variant['url'] = media_url(variant['path'], variant.get('hash'))
+        return variants
+    
+    def __init__(self, **kwargs):
+        super(Media, self).__init__(**kwargs)
+        self.init_counter_offsets()
+    
+    @orm.reconstructor
+    def init_counter_offsets(self):
+        """Unfolded shard sums by counter name, set by app.utils.counters.load_counter_shards"""
+        self.counter_offsets = {}
+    
     def get_likes_count(self):
         """Get total likes count"""
-        return self.likes.count()
+        return (self.like_count or 0) + self.counter_offsets.get('like_count', 0)
     
     def get_comments_count(self):
         """Get total comments count"""
-        return self.comments.count()
+        return (self.comment_count or 0) + self.counter_offsets.get('comment_count', 0)
     
-    def to_dict(self):
-        """Convert media to dictionary for API responses"""
+    def to_dict(self, author=None):
+        """Convert media to dictionary for API responses.
+        
+        Feeds pass the author loaded for the whole page to avoid a per-item query.
+        """
+        from app.utils.media_delivery import media_url
+        
+        if author is None:
+            author = self.user
+        
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'username': self.user.username,
-            'profile_picture': self.user.profile_picture,
+            'username': author.username,
+            'profile_picture': author.profile_picture,
             'media_type': self.media_type,
             'file_path': self.file_path,
+            'media_url': media_url(self.file_path, self.content_hash),
             'thumbnail_path': self.thumbnail_path,
+            'variants': self.get_variants(),
+            'processing_status': self.processing_status,
             'caption': self.caption,
             'duration': self.duration,
             'music': self.music,
@@ -100,18 +147,32 @@ class Comment(db.Model):
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]),
                              lazy='dynamic')
     
-    def to_dict(self):
-        """Convert comment to dictionary for API responses"""
+    # Maintained with atomic increments (see app.utils.counters)
+    reply_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    # Comment lists page newest first with (created_at, id) cursors
+    __table_args__ = (
+        db.Index('ix_comments_thread', 'media_id', 'parent_id', 'created_at', 'id'),
+    )
+    
+    def to_dict(self, author=None):
+        """Convert comment to dictionary for API responses.
+        
+        Comment pages pass the author loaded for the whole page to avoid a per-item query.
+        """
+        if author is None:
+            author = self.user
+        
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'username': self.user.username,
-            'profile_picture': self.user.profile_picture,
+            'username': author.username,
+            'profile_picture': author.profile_picture,
             'media_id': self.media_id,
             'content': self.content,
             'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat(),
-            'replies_count': self.replies.count()
+            'replies_count': self.reply_count or 0
         }
     
     def __repr__(self):
@@ -134,6 +195,89 @@ class Like(db.Model):
     def __repr__(self):
         return f'<Like by {self.user_id} on {self.media_id}>'
 
+class Hashtag(db.Model):
+    """Normalized hashtag, stored lowercase without the leading '#'"""
+    __tablename__ = 'hashtags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    media_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert hashtag to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'media_count': self.media_count
+        }
+    
+    def __repr__(self):
+        return f'<Hashtag #{self.name}>'
+
+class MediaHashtag(db.Model):
+    """Posting list entry linking a hashtag to media tagged with it.
+    
+    created_at copies the media's creation time so a hashtag feed is read newest first
+    straight from the (hashtag_id, created_at) index.
+    """
+    __tablename__ = 'media_hashtags'
+    
+    hashtag_id = db.Column(db.Integer, db.ForeignKey('hashtags.id', ondelete='CASCADE'), primary_key=True)
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    
+    hashtag = db.relationship('Hashtag')
+    media = db.relationship('Media', backref=db.backref('hashtag_links', cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('ix_media_hashtags_recent', 'hashtag_id', 'created_at', 'media_id'),
+        db.Index('ix_media_hashtags_media', 'media_id'),
+    )
+    
+    def __repr__(self):
+        return f'<MediaHashtag {self.hashtag_id} on {self.media_id}>'
+
+class TrendingScore(db.Model):
+    """Materialized time-decayed engagement score of a reel.
+    
+    Scores are kept in log2 space relative to TRENDING_EPOCH, so newer engagement outweighs
+    older engagement without ever rewriting rows that received no new activity.
+    """
+    __tablename__ = 'trending_scores'
+    __table_args__ = (
+        db.Index('ix_trending_scores_rank', 'score', 'media_id'),
+    )
+    
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    media = db.relationship('Media', backref=db.backref('trending_score', uselist=False,
+                                                         cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<TrendingScore {self.media_id}: {self.score:.3f}>'
+
+class MediaCounterShard(db.Model):
+    """Slice of a hot media item's like or comment counter.
+    
+    While a media item is hot, increments go to a random shard instead of its Media row;
+    the true count is the Media column plus the sum of its shards until they are folded
+    back (see app.utils.counters).
+    """
+    __tablename__ = 'media_counter_shards'
+    
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    counter = db.Column(db.String(20), primary_key=True)  # 'like_count' or 'comment_count'
+    shard = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    media = db.relationship('Media', backref=db.backref('counter_shards', cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<MediaCounterShard {self.media_id}.{self.counter}[{self.shard}]: {self.value}>'
+
 class Report(db.Model):
     """User reports for inappropriate content"""
     __tablename__ = 'reports'
@@ -1,12 +1,13 @@
 from datetime import datetime
 from app import db
+from app.utils.search import register_message_search_ddl
 
 class Message(db.Model):
     """Chat messages between users"""
     __tablename__ = 'messages'
     
     id = db.Column(db.Integer, primary_key=True)
-    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False, index=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text)
@@ -14,6 +15,11 @@ class Message(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     read_at = db.Column(db.DateTime)
     
+    # Sync deltas look up messages read since a timestamp within the user's matches
+    __table_args__ = (
+        db.Index('ix_messages_match_read_at', 'match_id', 'read_at'),
+    )
+    
     # Relationship with chat attachments (images, etc.)
     attachments = db.relationship('ChatAttachment', backref='message', lazy='dynamic', cascade='all, delete-orphan')
     
@@ -41,6 +47,9 @@ class Message(db.Model):
     def __repr__(self):
         return f'<Message {self.id}: from {self.sender_id} to {self.recipient_id}>'
 
+# Full-text index over message content (FTS5 on SQLite, tsvector GIN index on Postgres)
+register_message_search_ddl(Message.__table__)
+
 class ChatAttachment(db.Model):
     """Attachments for chat messages (images, files, etc.)"""
     __tablename__ = 'chat_attachments'
@@ -64,3 +73,30 @@ class ChatAttachment(db.Model):
     
     def __repr__(self):
         return f'<ChatAttachment {self.id}: {self.file_type}>'
+
+class MessageArchiveSegment(db.Model):
+    """Compressed block of old messages from one match, moved out of the hot messages table"""
+    __tablename__ = 'message_archive_segments'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
+    
+    # Range of archived messages
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=False)
+    last_created_at = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    
+    # Compressed JSON list of message dictionaries
+    codec = db.Column(db.String(10), nullable=False)  # 'zstd', 'zlib'
+    payload = db.Column(db.LargeBinary, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_message_archive_match_last', 'match_id', 'last_message_id'),
+    )
+    
+    def __repr__(self):
+        return f'<MessageArchiveSegment {self.id}: match {self.match_id} ({self.message_count} messages)>'
@@ -0,0 +1,38 @@
+from datetime import datetime
+from app import db
+
+class ImageFingerprint(db.Model):
+    """Perceptual hash of an uploaded image, used to find the same photo reused elsewhere.
+
+    Each row belongs to either a media item (profile pictures and posted images) or a
+    verification selfie. The 64-bit dHash is stored as a signed BIGINT.
+    """
+    __tablename__ = 'image_fingerprints'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'profile_picture', 'media', 'selfie'
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), unique=True)
+    verification_id = db.Column(db.Integer, db.ForeignKey('verifications.id', ondelete='CASCADE'), unique=True)
+    dhash = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped when a reprocessed image is rehashed; the in-memory index reloads by it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    media = db.relationship('Media', backref=db.backref('fingerprint', uselist=False,
+                                                         cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        """Convert fingerprint to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'media_id': self.media_id,
+            'verification_id': self.verification_id,
+            'dhash': f'{self.dhash & 0xFFFFFFFFFFFFFFFF:016x}',
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<ImageFingerprint {self.kind} of user {self.user_id}>'
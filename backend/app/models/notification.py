@@ -0,0 +1,41 @@
+from datetime import datetime
+import json
+from app import db
+
+class Notification(db.Model):
+    """Persisted real-time event, replayed to clients that were offline when it was emitted"""
+    __tablename__ = 'notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # Monotonic per user
+    event = db.Column(db.String(50), nullable=False)  # Socket event name, e.g. 'new_match'
+    payload = db.Column(db.Text)  # JSON event data
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # Define unique constraint so each sequence number is used once per user
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'seq', name='_user_notification_seq_uc'),
+    )
+    
+    def to_dict(self):
+        """Convert notification to dictionary for API responses"""
+        return {
+            'seq': self.seq,
+            'event': self.event,
+            'data': json.loads(self.payload) if self.payload else None,
+            'created_at': self.created_at.isoformat()
+        }
+    
+    def __repr__(self):
+        return f'<Notification {self.user_id}#{self.seq}: {self.event}>'
+
+class NotificationCounter(db.Model):
+    """Last notification sequence number allocated to each user"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<NotificationCounter {self.user_id}: {self.last_seq}>'
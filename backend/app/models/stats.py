@@ -0,0 +1,34 @@
+from datetime import datetime
+from app import db
+
+class DailyStats(db.Model):
+    """Activity totals for one UTC day, rolled up from the source tables.
+
+    Rows are recomputed by app.utils.rollups, so admin time series read one row per day
+    however many users, messages or transactions the day had.
+    """
+    __tablename__ = 'daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    new_users = db.Column(db.Integer, default=0, nullable=False)
+    new_matches = db.Column(db.Integer, default=0, nullable=False)
+    new_messages = db.Column(db.Integer, default=0, nullable=False)
+    new_reels = db.Column(db.Integer, default=0, nullable=False)
+    new_reports = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0, nullable=False)  # Completed transactions
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert a day's totals to dictionary for API responses"""
+        return {
+            'date': self.day.isoformat(),
+            'new_users': self.new_users,
+            'new_matches': self.new_matches,
+            'new_messages': self.new_messages,
+            'new_reels': self.new_reels,
+            'new_reports': self.new_reports,
+            'revenue': self.revenue
+        }
+    
+    def __repr__(self):
+        return f'<DailyStats {self.day}>'
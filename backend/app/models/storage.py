@@ -0,0 +1,23 @@
+from datetime import datetime
+from app import db
+
+class StoredFile(db.Model):
+    """Content-addressed upload shared by every row that references the same bytes"""
+    __tablename__ = 'stored_files'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)  # Relative to UPLOAD_FOLDER
+    size = db.Column(db.BigInteger, nullable=False)
+    
+    # Number of media items, attachments and profile pictures using this file
+    ref_count = db.Column(db.Integer, default=1, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def url(self):
+        """Public URL of the file"""
+        return f'/static/uploads/{self.path}'
+    
+    def __repr__(self):
+        return f'<StoredFile {self.sha256[:12]} refs={self.ref_count}>'
@@ -0,0 +1,57 @@
+from datetime import datetime
+import json
+import uuid
+from app import db
+
+class UploadSession(db.Model):
+    """Resumable chunked upload in progress (reels and chat attachments)"""
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+
+    # What the upload becomes on completion
+    purpose = db.Column(db.String(20), nullable=False)  # 'reel', 'chat_attachment'
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'))  # For chat attachments
+    file_name = db.Column(db.String(255), nullable=False)
+
+    # Progress
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_size = db.Column(db.BigInteger, default=0, nullable=False)
+    checksum = db.Column(db.String(64))  # Optional SHA-256 of the whole file, verified on completion
+
+    # Status
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'completed', 'aborted'
+    extra_data = db.Column(db.Text)  # JSON form data supplied when the session was created
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+
+    def get_extra_data(self):
+        """Get the stored form data as a dictionary"""
+        if self.extra_data:
+            return json.loads(self.extra_data)
+        return {}
+
+    def is_complete(self):
+        """Check if every byte of the file has been received"""
+        return self.received_size == self.total_size
+
+    def to_dict(self):
+        """Convert upload session to dictionary for API responses"""
+        return {
+            'upload_id': self.id,
+            'purpose': self.purpose,
+            'match_id': self.match_id,
+            'file_name': self.file_name,
+            'total_size': self.total_size,
+            'offset': self.received_size,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<UploadSession {self.id}: {self.purpose} {self.received_size}/{self.total_size}>'
@@ -4,6 +4,7 @@ from flask_login import UserMixin
 from flask_security import RoleMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.utils.search import register_user_search_ddl
 
 # Role and UserRoles association table for Flask-Security
 roles_users = db.Table('roles_users',
@@ -141,9 +142,22 @@ class User(db.Model, UserMixin):
             'created_at': self.created_at.isoformat()
         }
     
+    def to_summary_dict(self):
+        """Compact profile shown to matches and in conversations"""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'first_name': self.first_name,
+            'profile_picture': self.profile_picture,
+            'is_online': self.is_online,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
+        }
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
+register_user_search_ddl(User.__table__)
+
 class UserPreference(db.Model):
     """User preferences for matching and privacy"""
     __tablename__ = 'user_preferences'
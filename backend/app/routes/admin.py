@@ -1,13 +1,21 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import desc
 from app import db
 from app.models.user import User, Verification
 from app.models.media import Media, Report
 from app.models.match import Match
-from app.models.message import Message
 from app.models.subscription import Subscription, Transaction
+from app.models.moderation import ImageFingerprint
+from app.utils.admin_stats import get_dashboard_snapshot
+from app.utils.feed import serialize_media_page
+from app.utils.hashtags import unindex_media_hashtags
+from app.utils.image_index import find_near_duplicates
+from app.utils.pagination import paginate_keyset
+from app.utils.rollups import get_daily_series
+from app.utils.search import ranked_user_search
+from app.utils.storage import release_media_files
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -20,75 +28,32 @@ def check_admin():
 @admin_bp.route('/dashboard', methods=['GET'])
 @login_required
 def dashboard():
-    """Get admin dashboard statistics"""
+    """Get admin dashboard statistics from the cached stats snapshot"""
     # Get date range from query parameters or default to last 30 days
-    days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
     
-    # User statistics
-    total_users = User.query.count()
-    new_users = User.query.filter(User.created_at >= start_date).count()
-    active_users = User.query.filter(User.last_seen >= (datetime.utcnow() - timedelta(days=7))).count()
-    verified_users = User.query.filter_by(is_verified=True).count()
-    premium_users = User.query.filter_by(is_premium=True).count()
-    
-    # Match statistics
-    total_matches = Match.query.count()
-    new_matches = Match.query.filter(Match.created_at >= start_date).count()
-    active_conversations = Match.query.filter(Match.last_activity >= start_date).count()
-    
-    # Message statistics
-    total_messages = Message.query.count()
-    new_messages = Message.query.filter(Message.created_at >= start_date).count()
-    
-    # Media statistics
-    total_reels = Media.query.filter_by(media_type='reel').count()
-    new_reels = Media.query.filter(Media.media_type == 'reel', Media.created_at >= start_date).count()
-    
-    # Report statistics
-    pending_reports = Report.query.filter_by(status='pending').count()
-    
-    # Verification statistics
-    pending_verifications = Verification.query.filter_by(is_verified=False).filter(Verification.rejected_reason == None).count()
+    return jsonify(get_dashboard_snapshot(days)), 200
+
+@admin_bp.route('/stats/daily', methods=['GET'])
+@login_required
+def daily_stats():
+    """Get daily new users, matches, messages, reels, reports and revenue, oldest first.
     
-    # Revenue statistics
-    revenue = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.status == 'completed',
-        Transaction.created_at >= start_date
-    ).scalar() or 0
+    Reads only the daily rollups; today's row is as fresh as the last rollup run.
+    """
+    days = min(max(request.args.get('days', 30, type=int), 1), 730)
+    end_day = datetime.utcnow().date() + timedelta(days=1)
     
-    return jsonify({
-        'user_stats': {
-            'total_users': total_users,
-            'new_users': new_users,
-            'active_users': active_users,
-            'verified_users': verified_users,
-            'premium_users': premium_users
-        },
-        'interaction_stats': {
-            'total_matches': total_matches,
-            'new_matches': new_matches,
-            'active_conversations': active_conversations,
-            'total_messages': total_messages,
-            'new_messages': new_messages
-        },
-        'content_stats': {
-            'total_reels': total_reels,
-            'new_reels': new_reels
-        },
-        'moderation_stats': {
-            'pending_reports': pending_reports,
-            'pending_verifications': pending_verifications
-        },
-        'revenue_stats': {
-            'revenue': revenue
-        }
-    }), 200
+    return jsonify({'days': get_daily_series(end_day - timedelta(days=days), end_day)}), 200
 
 @admin_bp.route('/users', methods=['GET'])
 @login_required
 def get_users():
-    """Get list of users with filtering options"""
+    """Get list of users with filtering options.
+
+    With `search`, users are ranked against the term and paged by `cursor`; otherwise
+    the list is sorted by `sort_by` and paged by `page`.
+    """
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -97,15 +62,6 @@ def get_users():
     query = User.query
     
     # Apply filters if provided
-    if 'search' in request.args:
-        search = f"%{request.args.get('search')}%"
-        query = query.filter(
-            (User.username.like(search)) |
-            (User.email.like(search)) |
-            (User.first_name.like(search)) |
-            (User.last_name.like(search))
-        )
-    
     if 'is_verified' in request.args:
         is_verified = request.args.get('is_verified').lower() == 'true'
         query = query.filter_by(is_verified=is_verified)
@@ -122,6 +78,27 @@ def get_users():
         created_before = datetime.fromisoformat(request.args.get('created_before'))
         query = query.filter(User.created_at <= created_before)
     
+    # Search goes through the full-text index, best matches first, paged on (score, id)
+    search = request.args.get('search', '').strip()
+    if search:
+        ranked = ranked_user_search(search)
+        if ranked is None:
+            return jsonify({'users': [], 'next_cursor': None}), 200
+        
+        query = query.join(ranked, ranked.c.id == User.id).add_columns(ranked.c.score)
+        try:
+            rows, next_cursor = paginate_keyset(
+                query, (ranked.c.score, User.id), request.args.get('cursor'), per_page,
+                key=lambda row: (row.score, row.User.id)
+            )
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        
+        return jsonify({
+            'users': [row.User.to_dict() for row in rows],
+            'next_cursor': next_cursor
+        }), 200
+    
     # Order by
     sort_by = request.args.get('sort_by', 'created_at')
     sort_direction = request.args.get('sort_direction', 'desc')
@@ -223,6 +200,20 @@ def update_user(user_id):
         'user': user.to_dict()
     }), 200
 
+@admin_bp.route('/users/<int:user_id>/duplicates', methods=['GET'])
+@login_required
+def get_user_duplicates(user_id):
+    """Find other users' images that are near duplicates of this user's photos and selfie"""
+    User.query.get_or_404(user_id)
+    
+    fingerprints = ImageFingerprint.query.filter_by(user_id=user_id).all()
+    
+    return jsonify({
+        'duplicates': find_near_duplicates(
+            fingerprints, request.args.get('distance', type=int), min(request.args.get('limit', 50, type=int), 200)
+        )
+    }), 200
+
 @admin_bp.route('/verifications', methods=['GET'])
 @login_required
 def get_verifications():
@@ -400,8 +391,7 @@ def update_report(report_id):
 def get_content():
     """Get content (reels, images) with filtering options"""
     # Pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
     
     # Build query with filters
     query = Media.query
@@ -421,17 +411,32 @@ def get_content():
         date_after = datetime.fromisoformat(request.args.get('date_after'))
         query = query.filter(Media.created_at >= date_after)
     
-    # Order by creation date
-    query = query.order_by(Media.created_at.desc())
+    # Newest first, continuing after the cursor
+    try:
+        content, next_cursor = paginate_keyset(
+            query, (Media.created_at, Media.id), request.args.get('cursor'), per_page
+        )
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
     
-    # Get content with pagination
-    content = query.paginate(page=page, per_page=per_page, error_out=False)
+    return jsonify({
+        'content': serialize_media_page(content),
+        'next_cursor': next_cursor
+    }), 200
+
+@admin_bp.route('/content/<int:media_id>/duplicates', methods=['GET'])
+@login_required
+def get_content_duplicates(media_id):
+    """Find other users' images that are near duplicates of an image"""
+    fingerprint = ImageFingerprint.query.filter_by(media_id=media_id).first()
+    
+    if not fingerprint:
+        return jsonify({'message': 'Image has not been fingerprinted'}), 404
     
     return jsonify({
-        'content': [item.to_dict() for item in content.items],
-        'total': content.total,
-        'pages': content.pages,
-        'current_page': content.page
+        'duplicates': find_near_duplicates(
+            [fingerprint], request.args.get('distance', type=int), min(request.args.get('limit', 50, type=int), 200)
+        )
     }), 200
 
 @admin_bp.route('/content/<int:media_id>', methods=['PUT'])
@@ -460,7 +465,9 @@ def delete_content(media_id):
     """Delete content (for moderation purposes)"""
     media = Media.query.get_or_404(media_id)
     
-    # Delete the media
+    # Delete the media with its hashtag postings and its reference to the stored files
+    unindex_media_hashtags(media)
+    release_media_files(media)
     db.session.delete(media)
     db.session.commit()
     
@@ -4,8 +4,12 @@ from app import db
 from app.models.user import User, UserLike, UserBlocked
 from app.models.match import Match
 from app.models.message import Message
-from app.models.media import Media, Comment, Like, Report
+from app.models.media import Media, Comment, Report, TrendingScore
 from app.models.subscription import Subscription, Transaction
+from app.utils.feed import serialize_media_page
+from app.utils.notifications import get_notifications_since, get_last_sequence
+from app.utils.pagination import paginate_keyset
+from app.utils.sync import build_sync_delta
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__)
@@ -98,50 +102,70 @@ def get_unread_messages():
         'unread_count': unread_count
     }), 200
 
+# Notification endpoints
+@api_bp.route('/notifications', methods=['GET'])
+@login_required
+def get_notifications():
+    """Get notifications after the client's last seen sequence number"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 500, type=int), 1000)
+    
+    notifications, has_more = get_notifications_since(current_user.id, since, limit=limit)
+    
+    return jsonify({
+        'notifications': [notification.to_dict() for notification in notifications],
+        'last_seq': notifications[-1].seq if notifications else max(since, get_last_sequence(current_user.id)),
+        'has_more': has_more
+    }), 200
+
+# Sync endpoints
+@api_bp.route('/sync', methods=['GET'])
+@login_required
+def sync():
+    """Get matches, messages, read watermarks, unmatches and profiles changed since a sync token"""
+    try:
+        delta = build_sync_delta(current_user, token=request.args.get('token'))
+    except ValueError:
+        return jsonify({'message': 'Invalid sync token'}), 400
+    
+    return jsonify(delta), 200
+
 # Reels endpoints
 @api_bp.route('/reels/trending', methods=['GET'])
 @login_required
 def get_trending_reels():
-    """Get trending reels based on view count and likes"""
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    """Get trending reels ranked by their precomputed time-decayed score"""
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
     
     # Get blocked users
     blocked_ids = [block.blocked_id for block in UserBlocked.query.filter_by(user_id=current_user.id).all()]
     blocked_by_ids = [block.user_id for block in UserBlocked.query.filter_by(blocked_id=current_user.id).all()]
     exclude_ids = blocked_ids + blocked_by_ids
     
-    # Query for trending reels
-    reels_query = Media.query.filter(
+    # Every reel gets a score row at creation, so the page is read off the score index
+    reels_query = Media.query.join(TrendingScore, TrendingScore.media_id == Media.id).filter(
         (Media.media_type == 'reel') &
         (Media.is_private == False)
-    )
+    ).add_columns(TrendingScore.score)
     
     if exclude_ids:
         reels_query = reels_query.filter(~Media.user_id.in_(exclude_ids))
     
-    # Order by view count and creation date
-    reels_query = reels_query.order_by(Media.view_count.desc(), Media.created_at.desc())
-    
-    # Get reels with pagination
-    reels = reels_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Walk the scores from the cursor
+    try:
+        rows, next_cursor = paginate_keyset(
+            reels_query, (TrendingScore.score, TrendingScore.media_id), request.args.get('cursor'), per_page,
+            key=lambda row: (row.score, row.Media.id)
+        )
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
     
-    # Check if the current user liked each reel
-    reels_data = []
-    for reel in reels.items:
-        reel_dict = reel.to_dict()
-        reel_dict['liked_by_me'] = Like.query.filter_by(
-            user_id=current_user.id,
-            media_id=reel.id
-        ).first() is not None
-        reels_data.append(reel_dict)
+    # Authors, counts and the current user's likes are loaded for the whole page at once
+    reels_data = serialize_media_page([row.Media for row in rows], viewer_id=current_user.id)
     
     return jsonify({
         'reels': reels_data,
-        'total': reels.total,
-        'pages': reels.pages,
-        'current_page': reels.page
+        'next_cursor': next_cursor
     }), 200
 
 # Subscription endpoints
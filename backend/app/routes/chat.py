@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-import os
 from datetime import datetime
 from app import db, socketio
 from app.models.user import User, UserBlocked
 from app.models.match import Match
 from app.models.message import Message, ChatAttachment
+from app.utils.archive import get_message_history, merge_message_history
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.notifications import notify, dispatch_notifications
+from app.utils.search import search_messages as search_messages_index
+from app.utils.storage import store_upload
+from app.utils.upload_validation import allowed_upload
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -24,6 +29,10 @@ def get_messages(match_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
+    # Cursor mode scrolls back through hot and archived history
+    if 'cursor' in request.args:
+        return get_message_history_page(match, per_page)
+    
     # Get messages with pagination
     messages = Message.query.filter_by(match_id=match_id) \
         .order_by(Message.created_at.desc()) \
@@ -43,14 +52,34 @@ def get_messages(match_id):
         'total': messages.total,
         'pages': messages.pages,
         'current_page': messages.page,
-        'other_user': {
-            'id': other_user.id,
-            'username': other_user.username,
-            'first_name': other_user.first_name,
-            'profile_picture': other_user.profile_picture,
-            'is_online': other_user.is_online,
-            'last_seen': other_user.last_seen.isoformat() if other_user.last_seen else None
-        }
+        'other_user': other_user.to_summary_dict()
+    }), 200
+
+def get_message_history_page(match, per_page):
+    """Keyset page of a match's history, reading archived segments past the hot range"""
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+        before_id = int(cursor[0]) if cursor is not None else None
+    except (ValueError, TypeError, IndexError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    hot_messages, archived = get_message_history(match.id, before_id=before_id, limit=per_page)
+    
+    # Mark messages as read if current user is the recipient
+    for msg in hot_messages:
+        if msg.recipient_id == current_user.id and not msg.is_read:
+            msg.mark_as_read()
+    
+    records = merge_message_history(hot_messages, archived, per_page)
+    
+    # Get other user info
+    other_user_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
+    other_user = User.query.get(other_user_id)
+    
+    return jsonify({
+        'messages': records,
+        'next_cursor': encode_cursor([records[-1]['id']]) if len(records) == per_page else None,
+        'other_user': other_user.to_summary_dict()
     }), 200
 
 @chat_bp.route('/matches/<int:match_id>/messages', methods=['POST'])
@@ -73,55 +102,38 @@ def send_message(match_id):
     if not data or not data.get('content'):
         return jsonify({'message': 'Message content is required'}), 400
     
-    # Get recipient ID
-    recipient_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
-    
     # Create message
-    message = Message(
-        match_id=match_id,
-        sender_id=current_user.id,
-        recipient_id=recipient_id,
-        content=data.get('content')
-    )
-    
-    db.session.add(message)
+    message = create_message(match, current_user.id, data.get('content'))
+    recipient_id = message.recipient_id
     
     # Handle attachments if any
     if request.files and 'attachment' in request.files:
         file = request.files['attachment']
         
-        if file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-            filename = f"chat_{match_id}_{timestamp}_{filename}"
-            
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'chat_attachments', filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            file.save(file_path)
+        if file.filename != '' and allowed_upload(file):
+            # Store the file, deduplicated by content
+            stored = store_upload(file)
             
             # Determine file type
-            file_type = get_file_type(filename)
+            file_type = get_file_type(secure_filename(file.filename))
             
             # Create attachment
             attachment = ChatAttachment(
                 message=message,
-                file_path=f"/static/uploads/chat_attachments/{filename}",
+                file_path=stored.url,
                 file_type=file_type,
                 file_name=file.filename
             )
             
             db.session.add(attachment)
     
-    # Update match last activity
-    match.last_activity = datetime.utcnow()
-    
     db.session.commit()
     
-    # Emit socket event with the new message
-    socketio.emit('new_message', {
+    # Notify the recipient of the new message
+    notify(recipient_id, 'new_message', {
         'message': message.to_dict()
-    }, room=f'user_{recipient_id}')
+    })
+    dispatch_notifications()
     
     return jsonify({
         'message': 'Message sent successfully',
@@ -150,6 +162,59 @@ def mark_message_read(message_id):
     
     return jsonify({'message': 'Message marked as read'}), 200
 
+@chat_bp.route('/messages/search', methods=['GET'])
+@login_required
+def search_messages():
+    """Search message history in one match or across all of the user's matches"""
+    term = request.args.get('q', '').strip()
+
+    if not term:
+        return jsonify({'message': 'Search query is required'}), 400
+
+    limit = min(request.args.get('limit', 20, type=int), 50)
+
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+        if cursor is not None:
+            cursor = (float(cursor[0]), int(cursor[1]))
+    except (ValueError, TypeError, IndexError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    # Scope the search to matches the current user belongs to
+    match_query = Match.query.with_entities(Match.id).filter(
+        (Match.user1_id == current_user.id) | (Match.user2_id == current_user.id)
+    )
+
+    if 'match_id' in request.args:
+        match_query = match_query.filter(Match.id == request.args.get('match_id', type=int))
+
+    match_ids = [row.id for row in match_query.all()]
+
+    if 'match_id' in request.args and not match_ids:
+        return jsonify({'message': 'Not authorized to search these messages'}), 403
+
+    hits = search_messages_index(term, match_ids, limit=limit, cursor=cursor)
+
+    # Hydrate the page of hits in one query, keeping relevance order
+    messages = {
+        msg.id: msg for msg in Message.query.filter(Message.id.in_([hit[0] for hit in hits])).all()
+    } if hits else {}
+
+    results = []
+    for message_id, score, snippet in hits:
+        if message_id in messages:
+            result = messages[message_id].to_dict()
+            result['snippet'] = snippet
+            result['score'] = score
+            results.append(result)
+
+    next_cursor = encode_cursor([hits[-1][1], hits[-1][0]]) if len(hits) == limit else None
+
+    return jsonify({
+        'results': results,
+        'next_cursor': next_cursor
+    }), 200
+
 @chat_bp.route('/matches/<int:match_id>/typing', methods=['POST'])
 @login_required
 def typing_indicator(match_id):
@@ -171,10 +236,23 @@ def typing_indicator(match_id):
     
     return jsonify({'message': 'Typing indicator sent'}), 200
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+def create_message(match, sender_id, content):
+    """Add a new message from sender_id to the match and bump its last activity"""
+    recipient_id = match.user2_id if match.user1_id == sender_id else match.user1_id
+    
+    message = Message(
+        match_id=match.id,
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        content=content
+    )
+    
+    db.session.add(message)
+    
+    # Update match last activity
+    match.last_activity = datetime.utcnow()
+    
+    return message
 
 def get_file_type(filename):
     """Determine file type based on extension"""
@@ -6,6 +6,7 @@ from app import db, socketio
 from app.models.user import User
 from app.models.match import Match
 from app.models.message import Message, ChatAttachment
+from app.utils.notifications import notify, dispatch_notifications, get_notifications_since, get_last_sequence
 
 def register_socket_events(socketio):
     """Register all socket event handlers"""
@@ -164,11 +165,12 @@ def register_socket_events(socketio):
         message_data = message.to_dict()
         emit('new_message', {'message': message_data}, room=f'match_{match_id}')
         
-        # Also send to recipient's personal room in case they're not in the match room
-        emit('new_message_notification', {
+        # Also notify the recipient's personal room; stored so it is replayed if they are offline
+        notify(recipient_id, 'new_message_notification', {
             'message': message_data,
             'match': match.to_dict(recipient_id)
-        }, room=f'user_{recipient_id}')
+        })
+        dispatch_notifications()
         
         return {'status': 'success', 'message': message_data}
     
@@ -228,6 +230,26 @@ def register_socket_events(socketio):
         
         return {'status': 'success'}
     
+    @socketio.on('sync_notifications')
+    def handle_sync_notifications(data):
+        """Replay notifications missed while disconnected"""
+        if not current_user.is_authenticated:
+            return {'error': 'Authentication required'}, 401
+        
+        since = (data or {}).get('since', 0)
+        
+        if not isinstance(since, int) or since < 0:
+            return {'error': 'A non-negative sequence is required'}, 400
+        
+        notifications, has_more = get_notifications_since(current_user.id, since)
+        
+        return {
+            'status': 'success',
+            'notifications': [notification.to_dict() for notification in notifications],
+            'last_seq': notifications[-1].seq if notifications else max(since, get_last_sequence(current_user.id)),
+            'has_more': has_more
+        }
+    
     @socketio.on('join_reel_room')
     def handle_join_reel_room(data):
         """Join a room for a specific reel"""
@@ -4,9 +4,10 @@ from sqlalchemy import and_, or_, not_
 from datetime import datetime
 import random
 from math import radians, cos, sin, asin, sqrt
-from app import db, socketio
+from app import db
 from app.models.user import User, UserLike, UserBlocked
 from app.models.match import Match
+from app.utils.notifications import notify, dispatch_notifications
 
 match_bp = Blueprint('match', __name__)
 
@@ -134,19 +135,21 @@ def like_user(user_id):
         is_match = True
         match_id = match.id
         
-        # Emit socket event for the match
-        socketio.emit('new_match', {
+        # Notify the other user of the match
+        notify(user_id, 'new_match', {
             'match_id': match.id,
             'user': current_user.to_dict()
-        }, room=f'user_{user_id}')
+        })
+        dispatch_notifications()
     else:
         db.session.commit()
         
         # If super like, notify the other user
         if is_super_like:
-            socketio.emit('super_like', {
+            notify(user_id, 'super_like', {
                 'from_user': current_user.to_dict()
-            }, room=f'user_{user_id}')
+            })
+            dispatch_notifications()
     
     return jsonify({
         'message': 'User liked successfully',
@@ -210,9 +213,10 @@ def unmatch(match_id):
     other_user_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
     
     # Notify other user
-    socketio.emit('unmatch', {
+    notify(other_user_id, 'unmatch', {
         'match_id': match.id
-    }, room=f'user_{other_user_id}')
+    })
+    dispatch_notifications()
     
     return jsonify({'message': 'Unmatched successfully'}), 200
 
@@ -0,0 +1,15 @@
+import os
+from flask import Blueprint, request, jsonify
+from app.utils.media_delivery import resolve_upload_path, send_media_file
+
+media_bp = Blueprint('media', __name__)
+
+@media_bp.route('/<path:filename>', methods=['GET'])
+def serve_media(filename):
+    """Serve an uploaded file with range requests and cache validators"""
+    path = resolve_upload_path(filename)
+
+    if path is None or not os.path.isfile(path):
+        return jsonify({'message': 'File not found'}), 404
+
+    return send_media_file(path, version=request.args.get('v'))
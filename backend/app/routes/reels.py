@@ -1,21 +1,34 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import os
-from datetime import datetime
-from app import db, socketio
+from app import db
 from app.models.user import User, UserBlocked
-from app.models.media import Media, Comment, Like, Report
+from app.models.media import Media, Comment, Like, Report, Hashtag, MediaHashtag, TrendingScore
+from app.utils.counters import increment_media_counter, increment_reply_count, load_counter_shards
+from app.utils.feed import serialize_media_page, serialize_comment_page, build_prefetch_manifest
+from app.utils.media_processing import enqueue_media_processing
+from app.utils.storage import store_upload, release_media_files
+from app.utils.upload_validation import allowed_upload
+from app.utils.live_counters import record_live_delta
+from app.utils.hashtags import normalize_hashtag, index_media_hashtags, unindex_media_hashtags, search_hashtags
+from app.utils.notifications import notify, dispatch_notifications
+from app.utils.pagination import paginate_keyset
+from app.utils.personal_feed import next_feed_ids, peek_feed_ids, hydrate_feed, reset_feed, blocked_user_ids
+from app.utils.trending import record_engagement, initial_score
+from datetime import datetime
 
 reels_bp = Blueprint('reels', __name__)
 
+REEL_EXTENSIONS = ['mp4', 'mov', 'avi']
+
+# Most replies shown under each comment of a comment page
+MAX_REPLY_PREVIEW = 10
+
 @reels_bp.route('/', methods=['GET'])
 @login_required
 def get_reels():
-    """Get reels feed"""
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    """Get reels feed, newest first, one cursor page at a time"""
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    cursor = request.args.get('cursor')
     
     # Get blocked users
     blocked_ids = [block.blocked_id for block in UserBlocked.query.filter_by(user_id=current_user.id).all()]
@@ -30,7 +43,7 @@ def get_reels():
     reels_query = Media.query.filter(
         (Media.media_type == 'reel') &
         (Media.is_private == False)
-    ).order_by(Media.created_at.desc())
+    )
     
     if exclude_ids:
         reels_query = reels_query.filter(~Media.user_id.in_(exclude_ids))
@@ -39,28 +52,94 @@ def get_reels():
     if 'user_id' in request.args:
         reels_query = reels_query.filter_by(user_id=request.args.get('user_id', type=int))
     
+    # Keyset columns the page is ordered by, and how to read them back from a row
+    sort_columns = (Media.created_at, Media.id)
+    sort_key = None
+    by_score = False
+    
     if 'hashtag' in request.args:
-        hashtag = request.args.get('hashtag')
-        reels_query = reels_query.filter(Media.hashtags.like(f'%{hashtag}%'))
-    
-    # Get reels with pagination
-    reels = reels_query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    # Check if the current user liked each reel
-    reels_data = []
-    for reel in reels.items:
-        reel_dict = reel.to_dict()
-        reel_dict['liked_by_me'] = Like.query.filter_by(
-            user_id=current_user.id,
-            media_id=reel.id
-        ).first() is not None
-        reels_data.append(reel_dict)
+        hashtag = Hashtag.query.filter_by(name=normalize_hashtag(request.args.get('hashtag'))).first()
+        
+        if not hashtag:
+            return jsonify({'reels': [], 'next_cursor': None}), 200
+        
+        # Walk the hashtag's posting list instead of scanning every reel's hashtag string
+        reels_query = reels_query.join(MediaHashtag, MediaHashtag.media_id == Media.id) \
+            .filter(MediaHashtag.hashtag_id == hashtag.id)
+        
+        if request.args.get('sort') == 'trending':
+            # Every reel gets its score row at creation, so the join drops none
+            reels_query = reels_query.join(TrendingScore, TrendingScore.media_id == Media.id) \
+                .add_columns(TrendingScore.score)
+            sort_columns = (TrendingScore.score, TrendingScore.media_id)
+            sort_key = lambda row: (row.score, row.Media.id)
+            by_score = True
+        else:
+            sort_columns = (MediaHashtag.created_at, MediaHashtag.media_id)
+            sort_key = lambda reel: (reel.created_at, reel.id)
+    
+    try:
+        reels, next_cursor = paginate_keyset(reels_query, sort_columns, cursor, per_page, key=sort_key)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    if by_score:
+        reels = [row.Media for row in reels]
+    
+    # Authors, counts and the current user's likes are loaded for the whole page at once
+    reels_data = serialize_media_page(reels, viewer_id=current_user.id)
     
     return jsonify({
         'reels': reels_data,
-        'total': reels.total,
-        'pages': reels.pages,
-        'current_page': reels.page
+        'next_cursor': next_cursor
+    }), 200
+
+@reels_bp.route('/for-you', methods=['GET'])
+@login_required
+def get_personal_reels():
+    """Get the next page of the current user's personalized feed.
+    
+    Pages are popped from a cached, ranked candidate list, so there is no cursor; each
+    reel is shown once. `refresh=1` rebuilds the candidates first.
+    """
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    
+    if request.args.get('refresh', type=int):
+        reset_feed(current_user.id)
+    
+    ids, has_more = next_feed_ids(current_user.id, per_page)
+    reels = hydrate_feed(current_user.id, ids)
+    
+    return jsonify({
+        'reels': serialize_media_page(reels, viewer_id=current_user.id),
+        'has_more': has_more
+    }), 200
+
+@reels_bp.route('/prefetch', methods=['GET'])
+@login_required
+def get_prefetch_manifest():
+    """Get delivery URLs, sizes and hashes of the next reels in the personalized feed.
+    
+    The reels are peeked from the cached candidates, not taken, so the next /for-you page
+    returns the same ones. `thumbnail` picks the preferred thumbnail variant.
+    """
+    count = min(max(request.args.get('count', 5, type=int), 1), 20)
+    variant = request.args.get('thumbnail', 'medium')
+    
+    ids = peek_feed_ids(current_user.id, count)
+    manifest = build_prefetch_manifest(ids, blocked_user_ids(current_user.id), variant)
+    
+    return jsonify({'reels': manifest}), 200
+
+@reels_bp.route('/hashtags', methods=['GET'])
+@login_required
+def autocomplete_hashtags():
+    """Suggest hashtags starting with the typed prefix"""
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    
+    return jsonify({
+        'hashtags': [hashtag.to_dict() for hashtag in search_hashtags(prefix, limit=limit)]
     }), 200
 
 @reels_bp.route('/<int:reel_id>', methods=['GET'])
@@ -82,8 +161,9 @@ def get_reel(reel_id):
     if reel.is_private and reel.user_id != current_user.id:
         return jsonify({'message': 'Reel not available'}), 403
     
-    # Increment view count
-    reel.increment_view()
+    # Increment view count (buffered, one view per viewer per dedup window)
+    if reel.increment_view(current_user.id):
+        record_live_delta(reel.id, 'views')
     
     # Check if the current user liked this reel
     liked = Like.query.filter_by(
@@ -92,17 +172,18 @@ def get_reel(reel_id):
     ).first() is not None
     
     # Get the reel data
+    load_counter_shards([reel])
     reel_data = reel.to_dict()
     reel_data['liked_by_me'] = liked
     
     # Get comments
     comments = Comment.query.filter_by(media_id=reel.id, parent_id=None) \
-        .order_by(Comment.created_at.desc()) \
+        .order_by(Comment.created_at.desc(), Comment.id.desc()) \
         .limit(20).all()
     
     return jsonify({
         'reel': reel_data,
-        'comments': [comment.to_dict() for comment in comments]
+        'comments': serialize_comment_page(comments)
     }), 200
 
 @reels_bp.route('/', methods=['POST'])
@@ -117,16 +198,9 @@ def create_reel():
     if video.filename == '':
         return jsonify({'message': 'No selected file'}), 400
     
-    if video and allowed_file(video.filename, ['mp4', 'mov', 'avi']):
-        # Save the video file
-        video_filename = secure_filename(video.filename)
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        video_filename = f"reel_{current_user.id}_{timestamp}_{video_filename}"
-        
-        video_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reels', video_filename)
-        os.makedirs(os.path.dirname(video_path), exist_ok=True)
-        
-        video.save(video_path)
+    if video and allowed_upload(video, REEL_EXTENSIONS):
+        # Store the video, deduplicated by content
+        stored_video = store_upload(video)
         
         # Get form data
         data = request.form
@@ -135,33 +209,19 @@ def create_reel():
         thumbnail_path = None
         if 'thumbnail' in request.files:
             thumbnail = request.files['thumbnail']
-            if thumbnail.filename != '' and allowed_file(thumbnail.filename, ['jpg', 'jpeg', 'png']):
-                thumbnail_filename = secure_filename(thumbnail.filename)
-                thumbnail_filename = f"thumb_{current_user.id}_{timestamp}_{thumbnail_filename}"
-                
-                thumbnail_path_full = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reels', 'thumbnails', thumbnail_filename)
-                os.makedirs(os.path.dirname(thumbnail_path_full), exist_ok=True)
-                
-                thumbnail.save(thumbnail_path_full)
-                thumbnail_path = f"/static/uploads/reels/thumbnails/{thumbnail_filename}"
+            if thumbnail.filename != '' and allowed_upload(thumbnail, ['jpg', 'jpeg', 'png']):
+                thumbnail_path = store_upload(thumbnail).url
         
         # Create the reel
-        reel = Media(
-            user_id=current_user.id,
-            media_type='reel',
-            file_path=f"/static/uploads/reels/{video_filename}",
-            thumbnail_path=thumbnail_path,
-            caption=data.get('caption', ''),
-            duration=data.get('duration', 0, type=int),
-            music=data.get('music', ''),
-            filter_used=data.get('filter', ''),
-            hashtags=data.get('hashtags', ''),
-            is_private=data.get('is_private', 'false').lower() == 'true'
-        )
+        reel = build_reel(current_user.id, stored_video.url, thumbnail_path, data)
+        reel.content_hash = stored_video.sha256
         
         db.session.add(reel)
         db.session.commit()
         
+        # Poster frame, resized variants and duration are filled in off the request path
+        enqueue_media_processing(reel.id)
+        
         return jsonify({
             'message': 'Reel created successfully',
             'reel': reel.to_dict()
@@ -179,7 +239,9 @@ def delete_reel(reel_id):
     if reel.user_id != current_user.id:
         return jsonify({'message': 'Not authorized to delete this reel'}), 403
     
-    # Delete the reel
+    # Delete the reel; its hashtag postings are removed with it
+    unindex_media_hashtags(reel)
+    release_media_files(reel)
     db.session.delete(reel)
     db.session.commit()
     
@@ -213,14 +275,18 @@ def like_reel(reel_id):
     )
     
     db.session.add(like)
+    increment_media_counter(reel_id, Media.like_count)
     db.session.commit()
+    record_engagement(reel_id, 'like')
+    record_live_delta(reel_id, 'likes')
     
     # Notify the reel owner
     if reel.user_id != current_user.id:
-        socketio.emit('reel_like', {
+        notify(reel.user_id, 'reel_like', {
             'reel_id': reel.id,
             'user': current_user.to_dict()
-        }, room=f'user_{reel.user_id}')
+        })
+        dispatch_notifications()
     
     return jsonify({'message': 'Reel liked successfully'}), 200
 
@@ -231,32 +297,64 @@ def unlike_reel(reel_id):
     like = Like.query.filter_by(user_id=current_user.id, media_id=reel_id).first_or_404()
     
     db.session.delete(like)
+    increment_media_counter(reel_id, Media.like_count, -1)
     db.session.commit()
+    record_live_delta(reel_id, 'likes', -1)
     
     return jsonify({'message': 'Reel unliked successfully'}), 200
 
 @reels_bp.route('/<int:reel_id>/comments', methods=['GET'])
 @login_required
 def get_comments(reel_id):
-    """Get comments for a reel"""
+    """Get comments for a reel, newest first, one cursor page at a time.
+    
+    `replies=N` also returns the newest N replies of every comment. `comment_count` is
+    the reel's stored count, which includes replies.
+    """
     reel = Media.query.filter_by(id=reel_id, media_type='reel').first_or_404()
     
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    replies = min(max(request.args.get('replies', 0, type=int), 0), MAX_REPLY_PREVIEW)
     
     # Query for comments
-    comments_query = Comment.query.filter_by(media_id=reel_id, parent_id=None) \
-        .order_by(Comment.created_at.desc())
+    comments_query = Comment.query.filter_by(media_id=reel_id, parent_id=None)
+    
+    try:
+        comments, next_cursor = paginate_keyset(
+            comments_query, (Comment.created_at, Comment.id), request.args.get('cursor'), per_page
+        )
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    load_counter_shards([reel])
+    
+    return jsonify({
+        'comments': serialize_comment_page(comments, replies),
+        'comment_count': reel.get_comments_count(),
+        'next_cursor': next_cursor
+    }), 200
+
+@reels_bp.route('/comments/<int:comment_id>/replies', methods=['GET'])
+@login_required
+def get_replies(comment_id):
+    """Get replies to a comment, newest first; continues from a thread's replies_cursor"""
+    comment = Comment.query.get_or_404(comment_id)
     
-    # Get comments with pagination
-    comments = comments_query.paginate(page=page, per_page=per_page, error_out=False)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    
+    replies_query = Comment.query.filter_by(media_id=comment.media_id, parent_id=comment.id)
+    
+    try:
+        replies, next_cursor = paginate_keyset(
+            replies_query, (Comment.created_at, Comment.id), request.args.get('cursor'), per_page
+        )
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
     
     return jsonify({
-        'comments': [comment.to_dict() for comment in comments.items],
-        'total': comments.total,
-        'pages': comments.pages,
-        'current_page': comments.page
+        'replies': serialize_comment_page(replies),
+        'total': comment.reply_count or 0,
+        'next_cursor': next_cursor
     }), 200
 
 @reels_bp.route('/<int:reel_id>/comments', methods=['POST'])
@@ -279,30 +377,43 @@ def add_comment(reel_id):
     if not data or not data.get('content'):
         return jsonify({'message': 'Comment content is required'}), 400
     
+    # Replies must belong to a comment on the same reel
+    parent_comment = None
+    if data.get('parent_id'):
+        parent_comment = Comment.query.filter_by(id=data.get('parent_id'), media_id=reel_id).first()
+        if not parent_comment:
+            return jsonify({'message': 'Parent comment not found'}), 404
+    
     # Create comment
     comment = Comment(
         user_id=current_user.id,
         media_id=reel_id,
         content=data.get('content'),
-        parent_id=data.get('parent_id')  # For replies to comments
+        parent_id=parent_comment.id if parent_comment else None  # For replies to comments
     )
     
     db.session.add(comment)
+    increment_media_counter(reel_id, Media.comment_count)
+    if parent_comment:
+        increment_reply_count(parent_comment.id)
     db.session.commit()
+    record_engagement(reel_id, 'comment')
+    record_live_delta(reel_id, 'comments')
     
     # Notify the reel owner or parent comment owner
-    if comment.parent_id:
-        parent_comment = Comment.query.get(comment.parent_id)
-        if parent_comment and parent_comment.user_id != current_user.id:
-            socketio.emit('comment_reply', {
+    if parent_comment:
+        if parent_comment.user_id != current_user.id:
+            notify(parent_comment.user_id, 'comment_reply', {
                 'comment': comment.to_dict(),
                 'reel_id': reel.id
-            }, room=f'user_{parent_comment.user_id}')
+            })
     elif reel.user_id != current_user.id:
-        socketio.emit('reel_comment', {
+        notify(reel.user_id, 'reel_comment', {
             'comment': comment.to_dict(),
             'reel_id': reel.id
-        }, room=f'user_{reel.user_id}')
+        })
+    
+    dispatch_notifications()
     
     return jsonify({
         'message': 'Comment added successfully',
@@ -323,7 +434,11 @@ def delete_comment(comment_id):
     
     # Delete the comment
     db.session.delete(comment)
+    increment_media_counter(comment.media_id, Media.comment_count, -1)
+    if comment.parent_id:
+        increment_reply_count(comment.parent_id, -1)
     db.session.commit()
+    record_live_delta(comment.media_id, 'comments', -1)
     
     return jsonify({'message': 'Comment deleted successfully'}), 200
 
@@ -352,9 +467,25 @@ def report_reel(reel_id):
     
     return jsonify({'message': 'Reel reported successfully'}), 201
 
-def allowed_file(filename, allowed_extensions=None):
-    """Check if file extension is allowed"""
-    if allowed_extensions is None:
-        allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+def build_reel(user_id, file_path, thumbnail_path, data):
+    """Build a reel from uploaded file paths and its form data, indexing its hashtags and
+    giving it its initial trending score"""
+    created_at = datetime.utcnow()
+    reel = Media(
+        user_id=user_id,
+        media_type='reel',
+        file_path=file_path,
+        thumbnail_path=thumbnail_path,
+        caption=data.get('caption', ''),
+        duration=data.get('duration', 0, type=int),
+        music=data.get('music', ''),
+        filter_used=data.get('filter', ''),
+        hashtags=data.get('hashtags', ''),
+        is_private=data.get('is_private', 'false').lower() == 'true',
+        created_at=created_at
+    )
+    reel.trending_score = TrendingScore(score=initial_score(created_at))
+    
+    index_media_hashtags(reel)
     
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
+    return reel
@@ -0,0 +1,305 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import secure_filename
+import hashlib
+import json
+import os
+from datetime import datetime
+from app import db
+from app.models.match import Match
+from app.models.message import ChatAttachment
+from app.models.upload import UploadSession
+from app.routes.chat import create_message, get_file_type
+from app.routes.reels import REEL_EXTENSIONS, build_reel
+from app.utils.media_processing import enqueue_media_processing
+from app.utils.notifications import notify, dispatch_notifications
+from app.utils.storage import store_local_file
+from app.utils.upload_validation import SNIFF_LENGTH, allowed_extension, check_magic
+
+uploads_bp = Blueprint('uploads', __name__)
+
+@uploads_bp.route('/', methods=['POST'])
+@login_required
+def create_upload():
+    """Start a resumable chunked upload session"""
+    data = request.get_json()
+
+    if not data or not data.get('file_name') or not data.get('purpose'):
+        return jsonify({'message': 'Purpose and file name are required'}), 400
+
+    purpose = data.get('purpose')
+    max_sizes = current_app.config['CHUNKED_UPLOAD_MAX_SIZE']
+
+    if purpose not in max_sizes:
+        return jsonify({'message': 'Unknown upload purpose'}), 400
+
+    total_size = data.get('total_size')
+    if not isinstance(total_size, int) or total_size <= 0:
+        return jsonify({'message': 'A positive total size is required'}), 400
+
+    if total_size > max_sizes[purpose]:
+        return jsonify({'message': 'File too large'}), 413
+
+    file_name = data.get('file_name')
+    match_id = None
+
+    if purpose == 'reel':
+        if not allowed_extension(file_name, REEL_EXTENSIONS):
+            return jsonify({'message': 'File type not allowed'}), 400
+    else:
+        if not allowed_extension(file_name):
+            return jsonify({'message': 'File type not allowed'}), 400
+
+        match = Match.query.filter_by(id=data.get('match_id')).first_or_404()
+
+        # Check if current user is part of the match
+        if match.user1_id != current_user.id and match.user2_id != current_user.id:
+            return jsonify({'message': 'Not authorized to send messages in this match'}), 403
+
+        if not match.is_active:
+            return jsonify({'message': 'Cannot send messages in an inactive match'}), 400
+
+        match_id = match.id
+
+    upload = UploadSession(
+        user_id=current_user.id,
+        purpose=purpose,
+        match_id=match_id,
+        file_name=file_name,
+        total_size=total_size,
+        checksum=(data.get('checksum') or '').lower() or None,
+        extra_data=json.dumps(form_values(data.get('metadata'))),
+        expires_at=datetime.utcnow() + current_app.config['UPLOAD_SESSION_TTL']
+    )
+
+    db.session.add(upload)
+    db.session.commit()
+
+    # Create the empty part file that chunks are appended to
+    part_path = get_part_path(upload.id)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, 'wb').close()
+
+    response = upload.to_dict()
+    response['chunk_size'] = current_app.config['UPLOAD_CHUNK_SIZE']
+
+    return jsonify(response), 201
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    """Get upload progress so an interrupted client can resume from the returned offset"""
+    upload = get_user_upload(upload_id)
+
+    return jsonify(upload.to_dict()), 200
+
+@uploads_bp.route('/<upload_id>/chunks', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Append a chunk at the given offset.
+
+    The chunk is the raw request body. The optional X-Chunk-SHA256 header is verified
+    before the chunk is accepted, so a corrupted chunk can be retried at the same offset.
+    """
+    upload = get_user_upload(upload_id, for_update=True)
+
+    if upload.status != 'pending':
+        return jsonify({'message': f'Upload is {upload.status}'}), 409
+
+    if upload.expires_at and upload.expires_at < datetime.utcnow():
+        return jsonify({'message': 'Upload has expired'}), 410
+
+    offset = request.args.get('offset', type=int)
+
+    # Chunks must arrive in order; tell the client where to resume otherwise
+    if offset != upload.received_size:
+        return jsonify({'message': 'Offset mismatch', 'offset': upload.received_size}), 409
+
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    remaining = upload.total_size - upload.received_size
+    limit = min(chunk_size, remaining)
+
+    digest = hashlib.sha256()
+    written = 0
+    header = b''
+    part_path = get_part_path(upload.id)
+
+    with open(part_path, 'r+b') as part:
+        part.seek(offset)
+
+        # Stream the body to disk instead of buffering it in memory
+        while True:
+            block = request.stream.read(64 * 1024)
+            if not block:
+                break
+
+            written += len(block)
+            if written > limit:
+                part.truncate(offset)
+                return jsonify({'message': 'Chunk exceeds the allowed size', 'offset': offset}), 413
+
+            # The first chunk must start with the magic bytes the file name claims
+            if offset == 0 and header is not None:
+                header += block[:SNIFF_LENGTH - len(header)]
+                if len(header) >= SNIFF_LENGTH:
+                    check_magic(upload.file_name, header)
+                    header = None
+
+            digest.update(block)
+            part.write(block)
+
+        if offset == 0 and header is not None:
+            check_magic(upload.file_name, header)
+
+        expected = request.headers.get('X-Chunk-SHA256')
+        if expected and expected.lower() != digest.hexdigest():
+            part.truncate(offset)
+            return jsonify({'message': 'Chunk checksum mismatch', 'offset': offset}), 400
+
+        part.truncate(offset + written)
+
+    upload.received_size = offset + written
+    db.session.commit()
+
+    return jsonify(upload.to_dict()), 200
+
+@uploads_bp.route('/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """Finish an upload and create the reel or chat attachment it was started for"""
+    upload = get_user_upload(upload_id, for_update=True)
+
+    if upload.status != 'pending':
+        return jsonify({'message': f'Upload is {upload.status}'}), 409
+
+    if upload.expires_at and upload.expires_at < datetime.utcnow():
+        return jsonify({'message': 'Upload has expired'}), 410
+
+    if not upload.is_complete():
+        return jsonify({'message': 'Upload is incomplete', 'offset': upload.received_size}), 409
+
+    part_path = get_part_path(upload.id)
+
+    if upload.checksum and file_sha256(part_path) != upload.checksum:
+        # Start over from the first byte; the received data cannot be trusted
+        with open(part_path, 'r+b') as part:
+            part.truncate(0)
+        upload.received_size = 0
+        db.session.commit()
+        return jsonify({'message': 'File checksum mismatch', 'offset': 0}), 400
+
+    # Form data sent at creation can be amended on completion
+    data = MultiDict({**upload.get_extra_data(), **form_values(request.get_json(silent=True))})
+
+    filename = secure_filename(upload.file_name)
+
+    if upload.purpose == 'reel':
+        stored = store_local_file(part_path, filename, digest=upload.checksum)
+
+        reel = build_reel(current_user.id, stored.url, None, data)
+        reel.content_hash = stored.sha256
+
+        db.session.add(reel)
+        upload.status = 'completed'
+        db.session.commit()
+
+        enqueue_media_processing(reel.id)
+
+        return jsonify({
+            'message': 'Reel created successfully',
+            'reel': reel.to_dict()
+        }), 201
+
+    match = Match.query.get_or_404(upload.match_id)
+
+    if not match.is_active:
+        return jsonify({'message': 'Cannot send messages in an inactive match'}), 400
+
+    stored = store_local_file(part_path, filename, digest=upload.checksum)
+
+    message = create_message(match, current_user.id, data.get('content', ''))
+
+    attachment = ChatAttachment(
+        message=message,
+        file_path=stored.url,
+        file_type=get_file_type(filename),
+        file_name=upload.file_name
+    )
+
+    db.session.add(attachment)
+    upload.status = 'completed'
+    db.session.commit()
+
+    # Notify the recipient of the new message
+    notify(message.recipient_id, 'new_message', {
+        'message': message.to_dict()
+    })
+    dispatch_notifications()
+
+    return jsonify({
+        'message': 'Message sent successfully',
+        'message_data': message.to_dict()
+    }), 201
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    """Abort an upload and discard the received chunks"""
+    upload = get_user_upload(upload_id)
+
+    if upload.status == 'pending':
+        upload.status = 'aborted'
+        db.session.commit()
+        remove_part_file(upload.id)
+
+    return jsonify({'message': 'Upload aborted'}), 200
+
+def get_user_upload(upload_id, for_update=False):
+    """Get an upload session owned by the current user or abort with 404"""
+    query = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id)
+
+    if for_update:
+        # Serialize concurrent chunk writes for the same session
+        query = query.with_for_update()
+
+    return query.first_or_404()
+
+def get_part_path(upload_id):
+    """Path of the temporary file holding the received bytes"""
+    return os.path.join(current_app.config['CHUNKED_UPLOAD_FOLDER'], f'{upload_id}.part')
+
+def remove_part_file(upload_id):
+    """Delete the temporary file of an upload if it exists"""
+    try:
+        os.remove(get_part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+def form_values(data):
+    """Flatten JSON metadata into form-style string values"""
+    if not isinstance(data, dict):
+        return {}
+    return {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in data.items()}
+
+def file_sha256(path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def expire_upload_sessions():
+    """Abort pending sessions past their expiry and delete their part files"""
+    expired = UploadSession.query.filter(
+        UploadSession.status == 'pending',
+        UploadSession.expires_at < datetime.utcnow()
+    ).all()
+
+    for upload in expired:
+        upload.status = 'aborted'
+        remove_part_file(upload.id)
+
+    db.session.commit()
+    return len(expired)
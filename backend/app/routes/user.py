@@ -1,12 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import os
 from datetime import datetime
 from app import db
 from app.models.user import User, UserPreference, UserInterest, UserBlocked, Verification
 from app.models.match import Match
 from app.models.media import Media
+from app.utils.media_processing import enqueue_media_processing
+from app.utils.storage import store_upload
+from app.utils.upload_validation import allowed_upload
 
 user_bp = Blueprint('user', __name__)
 
@@ -90,18 +91,12 @@ def update_profile_picture():
     if file.filename == '':
         return jsonify({'message': 'No selected file'}), 400
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        filename = f"{current_user.id}_{timestamp}_{filename}"
-        
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profile_pictures', filename)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        file.save(file_path)
+    if file and allowed_upload(file):
+        # Store the picture, deduplicated by content
+        stored = store_upload(file)
         
         # Update user profile picture
-        current_user.profile_picture = f"/static/uploads/profile_pictures/{filename}"
+        current_user.profile_picture = stored.url
         current_user.updated_at = datetime.utcnow()
         
         # Create a media entry for the profile picture
@@ -109,12 +104,16 @@ def update_profile_picture():
             user_id=current_user.id,
             media_type='image',
             file_path=current_user.profile_picture,
+            content_hash=stored.sha256,
             is_profile_picture=True
         )
         
         db.session.add(media)
         db.session.commit()
         
+        # Resized variants are generated in the background
+        enqueue_media_processing(media.id)
+        
         return jsonify({
             'message': 'Profile picture updated successfully',
             'profile_picture': current_user.profile_picture
@@ -226,8 +225,3 @@ def get_blocked_users():
             })
     
     return jsonify({'blocked_users': blocked_users}), 200
-
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
@@ -0,0 +1,136 @@
+import json
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select
+from app import db, socketio
+from app.models.user import User, Verification
+from app.models.match import Match
+from app.models.message import Message
+from app.models.media import Media, Report
+from app.models.subscription import Transaction
+from app.utils.archive import count_archived_messages
+
+DASHBOARD_KEY = 'admin:dashboard:{}'
+DASHBOARD_REFRESH_LOCK_KEY = 'admin:dashboard:{}:refreshing'
+
+def _count_if(condition):
+    """Conditional aggregate: number of rows matching condition"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def compute_dashboard_stats(days=30, now=None):
+    """Compute dashboard statistics with one conditional-aggregate query per table.
+
+    Every figure for a table (totals, recent, active, verified...) comes out of a single
+    scan with SUM(CASE ...) columns, and the moderation and revenue figures share one
+    SELECT of scalar subqueries. Archived messages are added from their segments' counts.
+    """
+    now = now or datetime.utcnow()
+    start_date = now - timedelta(days=days)
+    active_since = now - timedelta(days=7)
+
+    users = db.session.query(
+        func.count(User.id),
+        _count_if(User.created_at >= start_date),
+        _count_if(User.last_seen >= active_since),
+        _count_if(User.is_verified == True),
+        _count_if(User.is_premium == True)
+    ).one()
+
+    matches = db.session.query(
+        func.count(Match.id),
+        _count_if(Match.created_at >= start_date),
+        _count_if(Match.last_activity >= start_date)
+    ).one()
+
+    messages = db.session.query(
+        func.count(Message.id),
+        _count_if(Message.created_at >= start_date)
+    ).one()
+    archived_messages = count_archived_messages(start_date)
+
+    reels = db.session.query(
+        func.count(Media.id),
+        _count_if(Media.created_at >= start_date)
+    ).filter(Media.media_type == 'reel').one()
+
+    pending_reports = select(func.count(Report.id)).where(Report.status == 'pending').scalar_subquery()
+    pending_verifications = select(func.count(Verification.id)).where(
+        Verification.is_verified == False, Verification.rejected_reason == None
+    ).scalar_subquery()
+    revenue = select(func.coalesce(func.sum(Transaction.amount), 0)).where(
+        Transaction.status == 'completed', Transaction.created_at >= start_date
+    ).scalar_subquery()
+    moderation = db.session.query(pending_reports, pending_verifications, revenue).one()
+
+    return {
+        'user_stats': {
+            'total_users': int(users[0]),
+            'new_users': int(users[1]),
+            'active_users': int(users[2]),
+            'verified_users': int(users[3]),
+            'premium_users': int(users[4])
+        },
+        'interaction_stats': {
+            'total_matches': int(matches[0]),
+            'new_matches': int(matches[1]),
+            'active_conversations': int(matches[2]),
+            'total_messages': int(messages[0]) + archived_messages[0],
+            'new_messages': int(messages[1]) + archived_messages[1]
+        },
+        'content_stats': {
+            'total_reels': int(reels[0]),
+            'new_reels': int(reels[1])
+        },
+        'moderation_stats': {
+            'pending_reports': int(moderation[0]),
+            'pending_verifications': int(moderation[1])
+        },
+        'revenue_stats': {
+            'revenue': float(moderation[2] or 0)
+        },
+        'generated_at': now.isoformat()
+    }
+
+def refresh_dashboard_snapshot(days=30):
+    """Recompute the dashboard snapshot for a date range and cache it in Redis"""
+    from app import redis_client
+
+    stats = compute_dashboard_stats(days)
+    snapshot = {'stats': stats, 'computed_at': time.time()}
+    redis_client.set(DASHBOARD_KEY.format(days), json.dumps(snapshot), ex=current_app.config['ADMIN_STATS_TTL'])
+    return stats
+
+def get_dashboard_snapshot(days=30):
+    """Dashboard statistics from the cached snapshot.
+
+    A missing snapshot is computed in the request. One older than ADMIN_STATS_REFRESH is
+    still served while a background task (one at a time, via a Redis lock) recomputes it,
+    so the dashboard only waits on the aggregate queries on a cold cache.
+    """
+    from app import redis_client
+
+    cached = redis_client.get(DASHBOARD_KEY.format(days))
+    if cached is None:
+        return refresh_dashboard_snapshot(days)
+
+    snapshot = json.loads(cached)
+    age = time.time() - snapshot['computed_at']
+
+    if age > current_app.config['ADMIN_STATS_REFRESH'] and \
+            redis_client.set(DASHBOARD_REFRESH_LOCK_KEY.format(days), 1, nx=True, ex=60):
+        socketio.start_background_task(_refresh_in_background, current_app._get_current_object(), days)
+
+    return snapshot['stats']
+
+def _refresh_in_background(app, days):
+    with app.app_context():
+        from app import redis_client
+
+        try:
+            refresh_dashboard_snapshot(days)
+        except Exception:
+            app.logger.exception('Failed to refresh the admin dashboard snapshot')
+        finally:
+            redis_client.delete(DASHBOARD_REFRESH_LOCK_KEY.format(days))
+            db.session.remove()
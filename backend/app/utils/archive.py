@@ -0,0 +1,171 @@
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import case, func
+from sqlalchemy.orm import defer
+from app import db
+from app.models.message import Message, ChatAttachment, MessageArchiveSegment
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def compress_segment(records):
+    """Serialize and compress a list of message dictionaries, preferring zstd"""
+    raw = json.dumps(records, separators=(',', ':')).encode('utf-8')
+
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+def decompress_segment(segment):
+    """Decompress an archive segment back into a list of message dictionaries"""
+    if segment.codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd archive segments')
+        raw = zstandard.ZstdDecompressor().decompress(segment.payload)
+    else:
+        raw = zlib.decompress(segment.payload)
+
+    return json.loads(raw)
+
+def count_archived_messages(since):
+    """(total, created at or after `since`) of archived messages.
+
+    Segments are summed by message_count; only those straddling `since` are decompressed.
+    """
+    total, after = db.session.query(
+        func.coalesce(func.sum(MessageArchiveSegment.message_count), 0),
+        func.coalesce(func.sum(case(
+            (MessageArchiveSegment.first_created_at >= since, MessageArchiveSegment.message_count),
+            else_=0
+        )), 0)
+    ).one()
+
+    straddling = MessageArchiveSegment.query.options(defer(MessageArchiveSegment.payload)).filter(
+        MessageArchiveSegment.first_created_at < since,
+        MessageArchiveSegment.last_created_at >= since
+    ).all()
+    for segment in straddling:
+        after += sum(
+            1 for record in decompress_segment(segment)
+            if datetime.fromisoformat(record['created_at']) >= since
+        )
+
+    return int(total), int(after)
+
+def compact_messages(older_than, segment_size=500, match_id=None):
+    """Move messages created before `older_than` into compressed per-match segments.
+
+    Messages are compacted in id order, so each segment covers a contiguous id range of
+    one match. Archived rows and their attachments are deleted from the hot tables, which
+    also drops them from the message search index. Returns (segments, messages) written.
+    """
+    match_query = db.session.query(Message.match_id).filter(Message.created_at < older_than)
+    if match_id is not None:
+        match_query = match_query.filter(Message.match_id == match_id)
+
+    match_ids = [row.match_id for row in match_query.distinct().all()]
+    segments_written = 0
+    messages_archived = 0
+
+    for current_match_id in match_ids:
+        while True:
+            batch = Message.query.filter(
+                Message.match_id == current_match_id,
+                Message.created_at < older_than
+            ).order_by(Message.id).limit(segment_size).all()
+
+            if not batch:
+                break
+
+            message_ids = [message.id for message in batch]
+
+            # Attachments for the whole batch in one query
+            attachments = {}
+            for attachment in ChatAttachment.query.filter(ChatAttachment.message_id.in_(message_ids)).all():
+                attachments.setdefault(attachment.message_id, []).append(attachment.to_dict())
+
+            records = []
+            for message in batch:
+                record = {
+                    'id': message.id,
+                    'match_id': message.match_id,
+                    'sender_id': message.sender_id,
+                    'recipient_id': message.recipient_id,
+                    'content': message.content,
+                    'created_at': message.created_at.isoformat(),
+                    'is_read': message.is_read,
+                    'read_at': message.read_at.isoformat() if message.read_at else None,
+                    'attachments': attachments.get(message.id, [])
+                }
+                records.append(record)
+
+            codec, payload = compress_segment(records)
+
+            db.session.add(MessageArchiveSegment(
+                match_id=current_match_id,
+                first_message_id=batch[0].id,
+                last_message_id=batch[-1].id,
+                first_created_at=min(message.created_at for message in batch),
+                last_created_at=max(message.created_at for message in batch),
+                message_count=len(batch),
+                codec=codec,
+                payload=payload
+            ))
+
+            ChatAttachment.query.filter(ChatAttachment.message_id.in_(message_ids)) \
+                .delete(synchronize_session=False)
+            Message.query.filter(Message.id.in_(message_ids)).delete(synchronize_session=False)
+
+            # One transaction per segment keeps the archive and hot table consistent
+            db.session.commit()
+
+            segments_written += 1
+            messages_archived += len(batch)
+
+    return segments_written, messages_archived
+
+def get_message_history(match_id, before_id=None, limit=20):
+    """Get up to `limit` messages of a match older than `before_id`, newest first.
+
+    Reads the hot table first and only decompresses archive segments whose id range can
+    contain messages for this page. Returns the hot Message rows and the archived message
+    dictionaries; merge_message_history combines them into the page.
+    """
+    hot_query = Message.query.filter_by(match_id=match_id)
+    if before_id is not None:
+        hot_query = hot_query.filter(Message.id < before_id)
+
+    hot_messages = hot_query.order_by(Message.id.desc()).limit(limit).all()
+
+    # Only segments that overlap the page's id range need to be read
+    segment_query = MessageArchiveSegment.query.filter_by(match_id=match_id)
+    if before_id is not None:
+        segment_query = segment_query.filter(MessageArchiveSegment.first_message_id < before_id)
+    if len(hot_messages) == limit:
+        segment_query = segment_query.filter(MessageArchiveSegment.last_message_id > hot_messages[-1].id)
+
+    archived = []
+    for segment in segment_query.order_by(MessageArchiveSegment.last_message_id.desc()):
+        for record in decompress_segment(segment):
+            if before_id is None or record['id'] < before_id:
+                record['is_archived'] = True
+                archived.append(record)
+
+        # Segments of a match never overlap, so older segments cannot improve a full page
+        if len(archived) >= limit:
+            break
+
+    return hot_messages, archived
+
+def merge_message_history(hot_messages, archived, limit):
+    """Merge hot messages and archived records into one page, newest first"""
+    records = [message.to_dict() for message in hot_messages] + archived
+    records.sort(key=lambda record: record['id'], reverse=True)
+    return records[:limit]
+
+def archive_cutoff(age):
+    """Creation time before which messages are compacted"""
+    return datetime.utcnow() - age
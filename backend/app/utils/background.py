@@ -0,0 +1,44 @@
+import threading
+from app import db, socketio
+
+_started = set()
+_started_lock = threading.Lock()
+
+def start_once(target, *args):
+    """Start target(*args) as a background task unless this process already started it"""
+    _start(target, target, args)
+
+def start_periodic_job(app, job, interval, description, lock_key=None):
+    """Run job() every `interval` seconds from this process, in one process at a time if `lock_key` is set"""
+    _start(job, _periodic_loop, (app, job, interval, description, lock_key))
+
+def _start(key, target, args):
+    if key in _started:
+        return
+
+    with _started_lock:
+        if key in _started:
+            return
+        _started.add(key)
+
+    socketio.start_background_task(target, *args)
+
+def _periodic_loop(app, job, interval, description, lock_key):
+    while True:
+        socketio.sleep(interval)
+
+        with app.app_context():
+            try:
+                if lock_key is not None:
+                    from app import redis_client
+
+                    # The lock is left to expire so only one process runs the job per interval
+                    if not redis_client.set(lock_key, 1, nx=True, px=int(interval * 1000)):
+                        continue
+
+                job()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Failed to %s', description)
+            finally:
+                db.session.remove()
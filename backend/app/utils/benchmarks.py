@@ -0,0 +1,233 @@
+import os
+import random
+import shutil
+import statistics
+import threading
+import time
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.models.user import User
+from app.models.media import Media
+from app.utils.counters import increment_media_counter, promote_media_counters, shard_totals
+from app.utils.media_delivery import file_digest, media_url
+
+BENCHMARK_FOLDER = 'benchmark'
+
+class BrowserCache:
+    """Minimal HTTP cache for benchmarks.
+
+    Responses marked immutable (or with a positive max-age) are reused without a request;
+    anything else is revalidated with If-None-Match / If-Modified-Since. Range responses
+    are not stored.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, client, url, headers=None):
+        """Fetch a URL through the cache; returns (requests made, body bytes received)"""
+        headers = dict(headers or {})
+        cached = self.entries.get(url) if 'Range' not in headers else None
+
+        if cached is not None:
+            if cached['fresh']:
+                return 0, 0
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = client.get(url, headers=headers)
+        received = len(response.get_data())
+
+        if response.status_code == 200 and 'Range' not in headers:
+            cache_control = response.headers.get('Cache-Control', '')
+            self.entries[url] = {
+                'fresh': 'immutable' in cache_control or _max_age(cache_control) > 0,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+
+        response.close()
+        return 1, received
+
+def _max_age(cache_control):
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name == 'max-age' and value.isdigit():
+            return int(value)
+    return 0
+
+def benchmark_feed_delivery(items=20, video_size=4 * 1024 * 1024, thumb_size=40 * 1024,
+                            segment_size=512 * 1024, seeks=4, seed=0):
+    """Compare the static handler with /media for typical reel feed scrolling.
+
+    Patterns, each run for both URL styles with a fresh client cache per style:
+      cold    first scroll: every thumbnail plus the first video segment
+      reload  the same feed page again, with the thumbnails in the cache
+      scrub   `seeks` range reads at random offsets of every video
+      full    whole-video downloads, the cost of clients that do not send Range
+
+    Returns {style: {pattern: {requests, bytes, total_ms, median_ms, p95_ms}}}.
+    """
+    rng = random.Random(seed)
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], BENCHMARK_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+
+    try:
+        files = []
+        for index in range(items):
+            video_name = f'reel_{index}.mp4'
+            thumb_name = f'reel_{index}_thumb.jpg'
+            for name, size in ((video_name, video_size), (thumb_name, thumb_size)):
+                with open(os.path.join(folder, name), 'wb') as f:
+                    f.write(rng.randbytes(size))
+            files.append((video_name, thumb_name))
+
+        offsets = [
+            [rng.randrange(0, max(video_size - segment_size, 1)) for _ in range(seeks)]
+            for _ in files
+        ]
+
+        results = {}
+        for style in ('static', 'media'):
+            client = current_app.test_client()
+            cache = BrowserCache()
+
+            def url(name):
+                file_url = f'/static/uploads/{BENCHMARK_FOLDER}/{name}'
+                if style == 'static':
+                    return file_url
+                return media_url(file_url, file_digest(os.path.join(folder, name)))
+
+            def first_segment(video):
+                return cache.get(client, url(video), {'Range': f'bytes=0-{segment_size - 1}'})
+
+            feed_page = [
+                lambda thumb=thumb: cache.get(client, url(thumb)) for _, thumb in files
+            ] + [
+                lambda video=video: first_segment(video) for video, _ in files
+            ]
+
+            results[style] = {
+                'cold': _run(feed_page),
+                'reload': _run(feed_page),
+                'scrub': _run([
+                    lambda video=video, start=start: cache.get(
+                        client, url(video), {'Range': f'bytes={start}-{start + segment_size - 1}'}
+                    )
+                    for (video, _), starts in zip(files, offsets) for start in starts
+                ]),
+                'full': _run([
+                    lambda video=video: BrowserCache().get(client, url(video)) for video, _ in files
+                ])
+            }
+
+        return results
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _run(fetches):
+    """Time a list of fetch callables; each returns (requests, bytes)"""
+    requests = 0
+    received = 0
+    timings = []
+
+    for fetch in fetches:
+        started = time.perf_counter()
+        made, size = fetch()
+        timings.append((time.perf_counter() - started) * 1000)
+        requests += made
+        received += size
+
+    return dict({'requests': requests, 'bytes': received}, **_latency_stats(timings))
+
+def _latency_stats(timings):
+    """Total, median and p95 of a list of millisecond timings"""
+    timings = sorted(timings)
+    return {
+        'total_ms': round(sum(timings), 2),
+        'median_ms': round(statistics.median(timings), 3) if timings else 0,
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3) if timings else 0
+    }
+
+def benchmark_counter_contention(writers=8, increments=200):
+    """Measure concurrent likes on one media item with and without sharded counters.
+
+    Modes, each on a fresh throwaway media item:
+      row      every increment updates the Media row (sharding disabled)
+      auto     sharding with the configured MEDIA_COUNTER_HOT_THRESHOLD, promoted mid-run
+      sharded  shards created up front
+
+    Each writer thread commits every increment on its own session, retrying on lock
+    errors. Returns {mode: {writes, seconds, writes_per_sec, retries, exact, total_ms,
+    median_ms, p95_ms}}; `exact` checks the summed count against the writes made.
+    """
+    app = current_app._get_current_object()
+    owner = User.query.order_by(User.id).first()
+    if owner is None:
+        raise RuntimeError('The counter benchmark needs at least one user')
+
+    configured_threshold = app.config['MEDIA_COUNTER_HOT_THRESHOLD']
+    results = {}
+
+    for mode in ('row', 'auto', 'sharded'):
+        media = Media(user_id=owner.id, media_type='reel', file_path='/static/uploads/benchmark.mp4',
+                      processing_status='ready')
+        db.session.add(media)
+        db.session.commit()
+        media_id = media.id
+
+        app.config['MEDIA_COUNTER_HOT_THRESHOLD'] = 0 if mode == 'row' else configured_threshold
+        if mode == 'sharded':
+            app.config['MEDIA_COUNTER_HOT_THRESHOLD'] = configured_threshold or 1
+            promote_media_counters(media_id)
+            db.session.commit()
+
+        timings = []
+        retries = []
+
+        def write():
+            with app.app_context():
+                for _ in range(increments):
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            increment_media_counter(media_id, Media.like_count)
+                            db.session.commit()
+                            break
+                        except OperationalError:
+                            db.session.rollback()
+                            retries.append(1)
+                    timings.append((time.perf_counter() - started) * 1000)
+                db.session.remove()
+
+        try:
+            threads = [threading.Thread(target=write) for _ in range(writers)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            app.config['MEDIA_COUNTER_HOT_THRESHOLD'] = configured_threshold
+
+        db.session.expire_all()
+        media = db.session.get(Media, media_id)
+        total = (media.like_count or 0) + shard_totals([media_id]).get(media_id, {}).get('like_count', 0)
+        writes = writers * increments
+
+        results[mode] = dict({
+            'writes': writes,
+            'seconds': round(elapsed, 3),
+            'writes_per_sec': round(writes / elapsed, 1) if elapsed else 0,
+            'retries': len(retries),
+            'exact': total == writes
+        }, **_latency_stats(timings))
+
+        db.session.delete(media)
+        db.session.commit()
+
+    return results
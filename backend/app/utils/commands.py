@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+search_cli = AppGroup('search', help='Search index maintenance')
+uploads_cli = AppGroup('uploads', help='Upload storage maintenance')
+messages_cli = AppGroup('messages', help='Chat message storage maintenance')
+notifications_cli = AppGroup('notifications', help='Notification inbox maintenance')
+media_cli = AppGroup('media', help='Media maintenance')
+trending_cli = AppGroup('trending', help='Trending score maintenance')
+moderation_cli = AppGroup('moderation', help='Moderation index maintenance')
+stats_cli = AppGroup('stats', help='Admin statistics maintenance')
+
+@search_cli.command('rebuild')
+def rebuild_search_index():
+    """Create missing search indexes and reindex existing rows"""
+    from app.utils.search import rebuild_message_search_index, rebuild_user_search_index
+
+    dialect = rebuild_message_search_index()
+    click.echo(f'Message search index rebuilt ({dialect})')
+    rebuild_user_search_index()
+    click.echo(f'User search index rebuilt ({dialect})')
+
+@uploads_cli.command('expire')
+def expire_uploads():
+    """Abort expired chunked upload sessions and delete their partial files"""
+    from app.routes.uploads import expire_upload_sessions
+
+    count = expire_upload_sessions()
+    click.echo(f'Expired {count} upload sessions')
+
+@uploads_cli.command('gc')
+@click.option('--grace-hours', type=float, default=None, help='Keep files modified within this many hours')
+@click.option('--dry-run', is_flag=True, help='Report what would be deleted without deleting')
+def collect_uploads(grace_hours, dry_run):
+    """Delete upload files that no row references any more"""
+    from app.utils.upload_gc import collect_orphaned_uploads
+
+    grace = timedelta(hours=grace_hours) if grace_hours is not None else None
+    report = collect_orphaned_uploads(grace=grace, dry_run=dry_run)
+
+    action = 'Would delete' if dry_run else 'Deleted'
+    click.echo(
+        f"{action} {report['deleted_files']} of {report['scanned_files']} files, "
+        f"reclaiming {report['reclaimed_bytes']} bytes ({report['kept_recent']} recent files kept)"
+    )
+
+@messages_cli.command('archive')
+@click.option('--days', type=int, default=None, help='Archive messages older than this many days')
+@click.option('--match-id', type=int, default=None, help='Only archive this match')
+def archive_messages(days, match_id):
+    """Compact old messages into compressed archive segments"""
+    from app.utils.archive import archive_cutoff, compact_messages
+
+    age = timedelta(days=days) if days is not None else current_app.config['MESSAGE_ARCHIVE_AFTER']
+    segments, messages = compact_messages(
+        archive_cutoff(age),
+        segment_size=current_app.config['MESSAGE_ARCHIVE_SEGMENT_SIZE'],
+        match_id=match_id
+    )
+    click.echo(f'Archived {messages} messages into {segments} segments')
+
+@notifications_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Delete notifications older than this many days')
+def prune_notifications(days):
+    """Delete notifications past the retention window"""
+    from app.utils.notifications import prune_notifications as prune
+
+    age = timedelta(days=days) if days is not None else current_app.config['NOTIFICATION_RETENTION']
+    deleted = prune(datetime.utcnow() - age)
+    click.echo(f'Deleted {deleted} notifications')
+
+@media_cli.command('recount')
+def recount_media():
+    """Recompute denormalized like, comment and reply counters from the source tables"""
+    from app.utils.counters import recount_media_counters
+
+    updated = recount_media_counters()
+    click.echo(f'Recounted counters for {updated} media items')
+
+@media_cli.command('flush-views')
+def flush_views():
+    """Write buffered view counts to the database now"""
+    from app.utils.views import flush_view_counts
+
+    updated = flush_view_counts()
+    click.echo(f'Flushed views for {updated} media items')
+
+@media_cli.command('index-hashtags')
+def index_hashtags():
+    """Build hashtag posting lists for media created before the hashtag index"""
+    from app.utils.hashtags import backfill_hashtags
+
+    indexed = backfill_hashtags()
+    click.echo(f'Indexed hashtags for {indexed} media items')
+
+@media_cli.command('process')
+@click.option('--failed', is_flag=True, help='Also retry media whose processing failed')
+def process_media(failed):
+    """Generate variants for media that was never processed, in this process"""
+    from app.models.media import Media
+    from app.utils.media_processing import process_media_now
+
+    statuses = ['pending', 'failed'] if failed else ['pending']
+    query = Media.query.filter(
+        Media.processing_status.in_(statuses) | Media.processing_status.is_(None)
+    ).order_by(Media.id)
+
+    processed = 0
+    for media in query.all():
+        try:
+            process_media_now(media)
+            processed += 1
+        except Exception as e:
+            click.echo(f'Failed to process media {media.id}: {e}', err=True)
+
+    click.echo(f'Processed {processed} media items')
+
+@media_cli.command('benchmark-delivery')
+@click.option('--items', type=int, default=20, help='Reels in the simulated feed page')
+@click.option('--video-kb', type=int, default=4096, help='Size of each reel video')
+@click.option('--segment-kb', type=int, default=512, help='Size of each range read')
+def benchmark_delivery(items, video_kb, segment_kb):
+    """Compare bytes and latency of /static and /media for feed scroll patterns"""
+    from app.utils.benchmarks import benchmark_feed_delivery
+
+    results = benchmark_feed_delivery(
+        items=items, video_size=video_kb * 1024, segment_size=segment_kb * 1024
+    )
+
+    click.echo(f"{'style':<8}{'pattern':<8}{'requests':>10}{'bytes':>14}{'total ms':>11}{'median ms':>11}{'p95 ms':>9}")
+    for style, patterns in results.items():
+        for pattern, stats in patterns.items():
+            click.echo(
+                f"{style:<8}{pattern:<8}{stats['requests']:>10}{stats['bytes']:>14}"
+                f"{stats['total_ms']:>11}{stats['median_ms']:>11}{stats['p95_ms']:>9}"
+            )
+
+@media_cli.command('fold-counters')
+def fold_counters():
+    """Move sharded like and comment counts into their media rows now"""
+    from app.utils.counters import fold_counter_shards
+
+    folded = fold_counter_shards()
+    click.echo(f'Folded counter shards of {folded} media items')
+
+@media_cli.command('benchmark-counters')
+@click.option('--writers', type=int, default=8, help='Concurrent writer threads')
+@click.option('--increments', type=int, default=200, help='Likes committed by each writer')
+def benchmark_counters(writers, increments):
+    """Compare concurrent like throughput on one media row with sharded counters"""
+    from app.utils.benchmarks import benchmark_counter_contention
+
+    results = benchmark_counter_contention(writers=writers, increments=increments)
+
+    click.echo(f"{'mode':<9}{'writes':>8}{'writes/s':>10}{'retries':>9}{'exact':>7}{'median ms':>11}{'p95 ms':>9}")
+    for mode, stats in results.items():
+        click.echo(
+            f"{mode:<9}{stats['writes']:>8}{stats['writes_per_sec']:>10}{stats['retries']:>9}"
+            f"{'yes' if stats['exact'] else 'no':>7}{stats['median_ms']:>11}{stats['p95_ms']:>9}"
+        )
+
+@trending_cli.command('rebuild')
+def rebuild_trending():
+    """Recompute every reel's trending score from likes, comments and views"""
+    from app.utils.trending import rebuild_trending_scores
+
+    scored = rebuild_trending_scores()
+    click.echo(f'Rebuilt trending scores for {scored} reels')
+
+@trending_cli.command('backfill')
+def backfill_trending():
+    """Give reels created before trending scores existed their initial score"""
+    from app.utils.trending import backfill_trending_scores
+
+    scored = backfill_trending_scores()
+    click.echo(f'Backfilled trending scores for {scored} reels')
+
+@trending_cli.command('refresh')
+def refresh_trending():
+    """Fold buffered engagement into trending scores now"""
+    from app.utils.trending import refresh_trending_scores
+
+    updated = refresh_trending_scores()
+    click.echo(f'Refreshed trending scores for {updated} reels')
+
+@moderation_cli.command('index-images')
+def index_images():
+    """Fingerprint images and verification selfies missing from the duplicate image index"""
+    from app.utils.image_index import backfill_image_fingerprints
+
+    added = backfill_image_fingerprints()
+    click.echo(f'Fingerprinted {added} images')
+
+@stats_cli.command('rollup')
+def rollup_stats():
+    """Recompute the daily stats of today and the last few days now"""
+    from app.utils.rollups import rollup_recent_days
+
+    days = rollup_recent_days()
+    click.echo(f'Rolled up {days} days')
+
+@stats_cli.command('backfill')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day to roll up (default: the first user\'s sign-up day)')
+def backfill_stats(since):
+    """Roll up daily stats for all history"""
+    from app.utils.rollups import backfill_rollups, first_activity_day
+
+    start_day = since.date() if since else first_activity_day()
+    days = backfill_rollups(start_day)
+    click.echo(f'Rolled up {days} days since {start_day.isoformat()}')
+
+def register_commands(app):
+    """Register CLI command groups with the app"""
+    app.cli.add_command(search_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(messages_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(media_cli)
+    app.cli.add_command(trending_cli)
+    app.cli.add_command(moderation_cli)
+    app.cli.add_command(stats_cli)
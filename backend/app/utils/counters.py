@@ -0,0 +1,270 @@
+import random
+import threading
+import time
+from flask import current_app
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db
+from app.models.media import Media, Comment, Like, MediaCounterShard
+
+# Media counters that are spread over shard rows while a media item is hot
+SHARDED_COUNTERS = ('like_count', 'comment_count')
+
+HOT_MEDIA_KEY = 'counters:hot:{}'
+WRITE_RATE_KEY = 'counters:rate:{}:{}'
+
+class WriteRateTracker:
+    """Per-second counter write rates and hot flags of media in this process"""
+
+    def __init__(self):
+        self.rates = {}
+        self.hot = {}
+        self.lock = threading.Lock()
+
+    def record(self, media_id, now):
+        """Count a write; returns (writes so far this second, whether the media is hot)"""
+        second = int(now)
+        with self.lock:
+            bucket, count = self.rates.get(media_id, (second, 0))
+            count = count + 1 if bucket == second else 1
+            self.rates[media_id] = (second, count)
+            return count, self.hot.get(media_id, 0) > now
+
+    def mark_hot(self, media_id, until):
+        with self.lock:
+            self.hot[media_id] = until
+
+    def is_hot(self, media_id, now):
+        return self.hot.get(media_id, 0) > now
+
+    def prune(self, now):
+        """Forget rates of past seconds and expired hot flags"""
+        second = int(now)
+        with self.lock:
+            self.rates = {key: value for key, value in self.rates.items() if value[0] >= second}
+            self.hot = {key: until for key, until in self.hot.items() if until > now}
+
+write_rates = WriteRateTracker()
+
+def increment_media_counter(media_id, column, amount=1):
+    """Atomically add `amount` to a Media counter column in the current transaction.
+
+    The increment runs as `UPDATE media SET col = col + n`, so concurrent writers never
+    lose updates the way a read-modify-write in Python does. Once a media item's writes
+    pass MEDIA_COUNTER_HOT_THRESHOLD per second it is promoted to sharded counting, and
+    like and comment increments go to one of MEDIA_COUNTER_SHARDS rows picked at random,
+    so concurrent writers stop queueing on the same row lock.
+    """
+    threshold = current_app.config['MEDIA_COUNTER_HOT_THRESHOLD']
+
+    if threshold and column.key in SHARDED_COUNTERS:
+        rate, hot = _track_write(media_id)
+
+        # Exactly one write per second sees the threshold, which keeps the hot flag fresh
+        if rate == threshold:
+            promote_media_counters(media_id)
+            hot = True
+
+        if hot and _increment_shard(media_id, column.key, amount):
+            # Shards are folded by the flusher, which may not have seen a view in this process
+            from app.utils.views import ensure_flusher
+            ensure_flusher(current_app._get_current_object())
+            return
+
+    Media.query.filter(Media.id == media_id).update(
+        {column: column + amount},
+        synchronize_session=False
+    )
+
+def increment_reply_count(comment_id, amount=1):
+    """Atomically add `amount` to a comment's reply counter in the current transaction"""
+    Comment.query.filter(Comment.id == comment_id).update(
+        {Comment.reply_count: Comment.reply_count + amount},
+        synchronize_session=False
+    )
+
+def _track_write(media_id):
+    """Record a counter write; returns (writes this second, whether the media is hot)"""
+    if current_app.config['VIEW_COUNTER_BACKEND'] != 'redis':
+        return write_rates.record(media_id, time.time())
+
+    from app import redis_client
+
+    rate_key = WRITE_RATE_KEY.format(media_id, int(time.time()))
+    pipe = redis_client.pipeline()
+    pipe.incr(rate_key)
+    pipe.expire(rate_key, 2)
+    pipe.exists(HOT_MEDIA_KEY.format(media_id))
+    rate, _, hot = pipe.execute()
+    return rate, bool(hot)
+
+def is_hot_media(media_ids):
+    """Subset of media_ids currently promoted to sharded counters"""
+    media_ids = list(media_ids)
+
+    if current_app.config['VIEW_COUNTER_BACKEND'] != 'redis':
+        now = time.time()
+        return {media_id for media_id in media_ids if write_rates.is_hot(media_id, now)}
+
+    from app import redis_client
+
+    pipe = redis_client.pipeline()
+    for media_id in media_ids:
+        pipe.exists(HOT_MEDIA_KEY.format(media_id))
+    return {media_id for media_id, hot in zip(media_ids, pipe.execute()) if hot}
+
+def promote_media_counters(media_id):
+    """Create a media item's counter shards and mark it hot for MEDIA_COUNTER_HOT_TTL.
+
+    The shard rows are added in the caller's transaction; until it commits, other
+    writers keep incrementing the Media row, which is just as correct.
+    """
+    shard_count = current_app.config['MEDIA_COUNTER_SHARDS']
+    existing = {
+        (row.counter, row.shard) for row in db.session.query(
+            MediaCounterShard.counter, MediaCounterShard.shard
+        ).filter(MediaCounterShard.media_id == media_id).all()
+    }
+    missing = [
+        MediaCounterShard(media_id=media_id, counter=counter, shard=shard, value=0)
+        for counter in SHARDED_COUNTERS for shard in range(shard_count)
+        if (counter, shard) not in existing
+    ]
+
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(missing)
+        except IntegrityError:
+            # A concurrent promotion created them first
+            pass
+
+    ttl = current_app.config['MEDIA_COUNTER_HOT_TTL']
+    if current_app.config['VIEW_COUNTER_BACKEND'] == 'redis':
+        from app import redis_client
+        redis_client.set(HOT_MEDIA_KEY.format(media_id), 1, ex=ttl)
+    else:
+        write_rates.mark_hot(media_id, time.time() + ttl)
+
+def _increment_shard(media_id, counter, amount):
+    """Add to a random shard of a counter; False if the shard does not exist (yet or any more)"""
+    shard = random.randrange(current_app.config['MEDIA_COUNTER_SHARDS'])
+    updated = MediaCounterShard.query.filter_by(media_id=media_id, counter=counter, shard=shard).update(
+        {MediaCounterShard.value: MediaCounterShard.value + amount},
+        synchronize_session=False
+    )
+    return bool(updated)
+
+def shard_totals(media_ids):
+    """Unfolded shard sums as {media_id: {counter: total}}, in one grouped query"""
+    if not media_ids:
+        return {}
+
+    rows = db.session.query(
+        MediaCounterShard.media_id, MediaCounterShard.counter, func.sum(MediaCounterShard.value)
+    ).filter(
+        MediaCounterShard.media_id.in_(list(media_ids))
+    ).group_by(MediaCounterShard.media_id, MediaCounterShard.counter).all()
+
+    totals = {}
+    for media_id, counter, total in rows:
+        totals.setdefault(media_id, {})[counter] = int(total or 0)
+    return totals
+
+def load_counter_shards(items):
+    """Attach unfolded shard sums to Media instances so their counts read the full total"""
+    totals = shard_totals({item.id for item in items})
+    for item in items:
+        item.counter_offsets = totals.get(item.id, {})
+
+def fold_counter_shards():
+    """Move shard values into their Media rows and drop the shards of media that cooled down.
+
+    Shard rows are locked and each one is decremented by the value that was read, so
+    increments that land during the fold are kept for the next one. Every hot Media row
+    is written once per fold instead of once per like or comment. Returns the number of
+    media items folded.
+    """
+    rows = db.session.query(
+        MediaCounterShard.media_id, MediaCounterShard.counter,
+        MediaCounterShard.shard, MediaCounterShard.value
+    ).filter(MediaCounterShard.value != 0).with_for_update().all()
+
+    totals = {}
+    for row in rows:
+        key = (row.media_id, row.counter)
+        totals[key] = totals.get(key, 0) + row.value
+
+    if rows:
+        media = Media.__table__
+        for counter in SHARDED_COUNTERS:
+            params = [
+                {'media_id': media_id, 'amount': total}
+                for (media_id, name), total in totals.items() if name == counter and total
+            ]
+            if params:
+                db.session.execute(
+                    update(media)
+                    .where(media.c.id == bindparam('media_id'))
+                    .values({
+                        counter: media.c[counter] + bindparam('amount'),
+                        # Counter folds are not content changes, so keep updated_at as it is
+                        'updated_at': media.c.updated_at
+                    }),
+                    params
+                )
+
+        shards = MediaCounterShard.__table__
+        db.session.execute(
+            update(shards)
+            .where(and_(
+                shards.c.media_id == bindparam('shard_media_id'),
+                shards.c.counter == bindparam('shard_counter'),
+                shards.c.shard == bindparam('shard_index')
+            ))
+            .values(value=shards.c.value - bindparam('folded')),
+            [
+                {'shard_media_id': row.media_id, 'shard_counter': row.counter,
+                 'shard_index': row.shard, 'folded': row.value}
+                for row in rows
+            ]
+        )
+
+    # Writers that find a shard gone fall back to the Media row
+    sharded_ids = {
+        media_id for (media_id,) in db.session.query(MediaCounterShard.media_id).distinct().all()
+    }
+    cooled = sharded_ids - is_hot_media(sharded_ids)
+    if cooled:
+        MediaCounterShard.query.filter(
+            MediaCounterShard.media_id.in_(list(cooled)),
+            MediaCounterShard.value == 0
+        ).delete(synchronize_session=False)
+
+    db.session.commit()
+    write_rates.prune(time.time())
+    return len({media_id for media_id, _ in totals})
+
+def recount_media_counters():
+    """Recompute like, comment and reply counters from the source tables.
+
+    Runs as one UPDATE per table with correlated counts, so it repairs drift in bulk
+    without loading rows into Python. Counter shards are cleared, since the recounted
+    columns are exact. Returns the number of media rows updated.
+    """
+    like_count = select(func.count(Like.id)).where(Like.media_id == Media.id).scalar_subquery()
+    comment_count = select(func.count(Comment.id)).where(Comment.media_id == Media.id).scalar_subquery()
+
+    updated = Media.query.update(
+        {Media.like_count: like_count, Media.comment_count: comment_count},
+        synchronize_session=False
+    )
+    MediaCounterShard.query.delete(synchronize_session=False)
+
+    replies = aliased(Comment)
+    reply_count = select(func.count(replies.id)).where(replies.parent_id == Comment.id).scalar_subquery()
+    Comment.query.update({Comment.reply_count: reply_count}, synchronize_session=False)
+
+    db.session.commit()
+    return updated
@@ -0,0 +1,167 @@
+import json
+import os
+from sqlalchemy import func
+from app import db
+from app.models.user import User
+from app.models.media import Media, Comment, Like
+from app.models.storage import StoredFile
+from app.utils.counters import load_counter_shards
+from app.utils.media_delivery import media_url
+from app.utils.media_processing import upload_url_to_path
+from app.utils.pagination import encode_cursor
+
+# Thumbnail variants tried, in order, after the requested one
+PREFETCH_THUMBNAIL_FALLBACK = ('medium', 'thumb', 'large', 'poster')
+
+def serialize_media_page(items, viewer_id=None):
+    """Serialize a page of media with a constant number of queries.
+
+    Authors and (when viewer_id is given) the viewer's own likes are each loaded for the
+    whole page in one set-based query. Like and comment counts are stored on Media, plus
+    the unfolded shards of hot media, read in one grouped query.
+    """
+    if not items:
+        return []
+
+    media_ids = [item.id for item in items]
+
+    authors = {
+        user.id: user
+        for user in User.query.filter(User.id.in_({item.user_id for item in items})).all()
+    }
+
+    load_counter_shards(items)
+
+    liked_ids = set()
+    if viewer_id is not None:
+        liked_ids = {
+            row.media_id for row in db.session.query(Like.media_id)
+            .filter(Like.user_id == viewer_id, Like.media_id.in_(media_ids)).all()
+        }
+
+    result = []
+    for item in items:
+        data = item.to_dict(author=authors.get(item.user_id))
+        if viewer_id is not None:
+            data['liked_by_me'] = item.id in liked_ids
+        result.append(data)
+
+    return result
+
+def serialize_comment_page(comments, replies_per_thread=0):
+    """Serialize a page of top-level comments with a constant number of queries.
+
+    Reply counts are stored on Comment. With replies_per_thread > 0 the newest replies of
+    every thread are fetched in one windowed query (ROW_NUMBER per parent), and the
+    authors of comments and replies are then loaded together in one set-based query.
+    Threads with more replies than shown get a `replies_cursor` to continue from.
+    """
+    if not comments:
+        return []
+
+    replies_by_parent = {}
+    if replies_per_thread > 0:
+        for reply in _load_reply_previews(comments, replies_per_thread):
+            replies_by_parent.setdefault(reply.parent_id, []).append(reply)
+
+    user_ids = {comment.user_id for comment in comments}
+    for replies in replies_by_parent.values():
+        user_ids.update(reply.user_id for reply in replies)
+
+    authors = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+
+    result = []
+    for comment in comments:
+        data = comment.to_dict(author=authors.get(comment.user_id))
+
+        if replies_per_thread > 0:
+            replies = replies_by_parent.get(comment.id, [])
+            data['replies'] = [reply.to_dict(author=authors.get(reply.user_id)) for reply in replies]
+            data['replies_cursor'] = None
+            if replies and (comment.reply_count or 0) > len(replies):
+                last = replies[-1]
+                data['replies_cursor'] = encode_cursor([last.created_at.isoformat(), last.id])
+
+        result.append(data)
+
+    return result
+
+def _load_reply_previews(comments, limit):
+    """Newest `limit` replies of each comment, ordered by thread then newest first"""
+    parent_ids = [comment.id for comment in comments if comment.reply_count]
+    if not parent_ids:
+        return []
+
+    newest_first = (Comment.created_at.desc(), Comment.id.desc())
+    ranked = db.session.query(
+        Comment.id.label('id'),
+        func.row_number().over(partition_by=Comment.parent_id, order_by=newest_first).label('position')
+    ).filter(
+        # media_id keeps the scan on the ix_comments_thread prefix
+        Comment.media_id.in_({comment.media_id for comment in comments}),
+        Comment.parent_id.in_(parent_ids)
+    ).subquery()
+
+    return Comment.query.join(ranked, Comment.id == ranked.c.id) \
+        .filter(ranked.c.position <= limit) \
+        .order_by(Comment.parent_id, *newest_first) \
+        .all()
+
+def build_prefetch_manifest(media_ids, excluded_users=(), thumbnail_variant='medium'):
+    """Compact delivery details of reels, in the given order, for clients to prefetch.
+
+    Reads only the columns needed in one query (the original's size comes from its
+    stored file row), so no authors, counts or full to_dict payloads are built. The
+    thumbnail is the requested variant when it exists, falling back to the closest one.
+    """
+    if not media_ids:
+        return []
+
+    rows = db.session.query(
+        Media.id, Media.user_id, Media.file_path, Media.thumbnail_path, Media.variants,
+        Media.content_hash, Media.duration, StoredFile.size
+    ).outerjoin(StoredFile, StoredFile.sha256 == Media.content_hash).filter(
+        Media.id.in_(media_ids),
+        Media.media_type == 'reel',
+        Media.is_private == False
+    ).all()
+
+    reels = {row.id: row for row in rows if row.user_id not in excluded_users}
+    preference = [thumbnail_variant] + [name for name in PREFETCH_THUMBNAIL_FALLBACK if name != thumbnail_variant]
+
+    manifest = []
+    for media_id in media_ids:
+        row = reels.get(media_id)
+        if row is None:
+            continue
+
+        variants = json.loads(row.variants) if row.variants else {}
+        thumbnail = next((variants[name] for name in preference if name in variants), None)
+        if thumbnail is None:
+            thumbnail = {'path': row.thumbnail_path, 'size': _upload_size(row.thumbnail_path)}
+
+        manifest.append({
+            'id': row.id,
+            'duration': row.duration,
+            'video': {
+                'url': media_url(row.file_path, row.content_hash),
+                'size': row.size if row.size is not None else _upload_size(row.file_path),
+                'hash': row.content_hash
+            },
+            'thumbnail': {
+                'url': media_url(thumbnail['path'], thumbnail.get('hash')),
+                'size': thumbnail.get('size'),
+                'hash': thumbnail.get('hash'),
+                'width': thumbnail.get('width'),
+                'height': thumbnail.get('height')
+            }
+        })
+
+    return manifest
+
+def _upload_size(url):
+    """Size of an upload not tracked by the content store; None if it cannot be found"""
+    try:
+        return os.path.getsize(upload_url_to_path(url))
+    except (ValueError, OSError):
+        return None
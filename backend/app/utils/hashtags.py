@@ -0,0 +1,134 @@
+import re
+from datetime import datetime
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.media import Media, Hashtag, MediaHashtag
+
+HASHTAG_PATTERN = re.compile(r'\w+')
+MAX_HASHTAG_LENGTH = 100
+
+def normalize_hashtag(tag):
+    """Normalize one hashtag to its stored form ('#Art' -> 'art'); None if nothing is left"""
+    match = HASHTAG_PATTERN.search(tag.strip().lstrip('#').lower()) if tag else None
+    return match.group(0)[:MAX_HASHTAG_LENGTH] if match else None
+
+def parse_hashtags(raw):
+    """Split a comma or space separated hashtag string into unique normalized names"""
+    names = []
+    for tag in re.split(r'[,\s]+', raw or ''):
+        name = normalize_hashtag(tag)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def get_or_create_hashtags(names):
+    """Load hashtags by name, creating missing ones, as {name: Hashtag}"""
+    if not names:
+        return {}
+
+    hashtags = {tag.name: tag for tag in Hashtag.query.filter(Hashtag.name.in_(names)).all()}
+
+    for name in names:
+        if name in hashtags:
+            continue
+        try:
+            with db.session.begin_nested():
+                tag = Hashtag(name=name, media_count=0)
+                db.session.add(tag)
+            hashtags[name] = tag
+        except IntegrityError:
+            # Another request created the hashtag first
+            hashtags[name] = Hashtag.query.filter_by(name=name).one()
+
+    return hashtags
+
+def index_media_hashtags(media):
+    """Add posting list entries for a new media item's hashtags"""
+    names = parse_hashtags(media.hashtags)
+    if not names:
+        return []
+
+    hashtags = get_or_create_hashtags(names)
+    created_at = media.created_at or datetime.utcnow()
+    media.created_at = created_at
+
+    for name in names:
+        tag = hashtags[name]
+        media.hashtag_links.append(MediaHashtag(hashtag=tag, created_at=created_at))
+
+    Hashtag.query.filter(Hashtag.id.in_([tag.id for tag in hashtags.values()])) \
+        .update({Hashtag.media_count: Hashtag.media_count + 1}, synchronize_session=False)
+
+    return names
+
+def unindex_media_hashtags(media):
+    """Decrement hashtag counts for media about to be deleted; its postings cascade"""
+    hashtag_ids = [link.hashtag_id for link in media.hashtag_links]
+    if hashtag_ids:
+        Hashtag.query.filter(Hashtag.id.in_(hashtag_ids)) \
+            .update({Hashtag.media_count: Hashtag.media_count - 1}, synchronize_session=False)
+
+def search_hashtags(prefix, limit=10):
+    """Hashtags starting with `prefix`, most used first.
+
+    The prefix is matched as a name range rather than with LIKE so the unique name index
+    is used on every database.
+    """
+    prefix = normalize_hashtag(prefix)
+    if not prefix:
+        return []
+
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    return Hashtag.query.filter(
+        Hashtag.name >= prefix,
+        Hashtag.name < upper,
+        Hashtag.media_count > 0
+    ).order_by(Hashtag.media_count.desc(), Hashtag.name).limit(limit).all()
+
+def backfill_hashtags(batch_size=1000):
+    """Build posting lists for media created before the hashtag index existed.
+
+    Media that already has postings is skipped, so the backfill can be re-run safely.
+    Returns the number of media items indexed.
+    """
+    indexed = 0
+    last_id = 0
+
+    while True:
+        batch = Media.query.with_entities(Media.id, Media.hashtags, Media.created_at).filter(
+            Media.id > last_id,
+            Media.hashtags.isnot(None),
+            Media.hashtags != '',
+            ~Media.hashtag_links.any()
+        ).order_by(Media.id).limit(batch_size).all()
+
+        if not batch:
+            break
+
+        last_id = batch[-1].id
+        parsed = [(row, parse_hashtags(row.hashtags)) for row in batch]
+        hashtags = get_or_create_hashtags(sorted({name for _, names in parsed for name in names}))
+
+        postings = [
+            {'hashtag_id': hashtags[name].id, 'media_id': row.id, 'created_at': row.created_at or datetime.utcnow()}
+            for row, names in parsed for name in names
+        ]
+        if postings:
+            db.session.execute(insert(MediaHashtag), postings)
+            indexed += len({posting['media_id'] for posting in postings})
+
+        db.session.commit()
+
+    recount_hashtags()
+    return indexed
+
+def recount_hashtags():
+    """Recompute every hashtag's media_count from its posting list"""
+    posting_count = db.session.query(func.count(MediaHashtag.media_id)) \
+        .filter(MediaHashtag.hashtag_id == Hashtag.id) \
+        .correlate(Hashtag).scalar_subquery()
+
+    Hashtag.query.update({Hashtag.media_count: posting_count}, synchronize_session=False)
+    db.session.commit()
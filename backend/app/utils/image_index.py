@@ -0,0 +1,233 @@
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from PIL import Image, ImageOps
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.user import User, Verification
+from app.models.media import Media
+from app.models.moderation import ImageFingerprint
+
+# Set bits of every byte value, for popcounts over uint64 hashes viewed as bytes
+POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def perceptual_hash(source_path):
+    """64-bit difference hash (dHash) of an image.
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel is brighter
+    than its right neighbour, so re-encoding, resizing and mild colour edits of the same
+    photo land within a few bits of each other. Runs in the media processing workers.
+    """
+    with Image.open(source_path) as original:
+        # JPEG decoders can skip most of the work at reduced sizes
+        original.draft('L', (64, 64))
+        image = ImageOps.exif_transpose(original).convert('L').resize((9, 8), Image.LANCZOS)
+        pixels = list(image.getdata())
+
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def to_signed(value):
+    """Store an unsigned 64-bit hash in a signed BIGINT column"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def hamming_distances(hashes, target):
+    """Bit distance from `target` to every hash of a uint64 array, vectorized"""
+    xor = np.bitwise_xor(hashes, np.uint64(target & 0xFFFFFFFFFFFFFFFF))
+    return POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+class PerceptualHashIndex:
+    """In-memory copy of every fingerprint as packed uint64 arrays.
+
+    A lookup is one XOR and a table popcount over the whole array, which scans millions
+    of hashes in milliseconds. Before each search, rows inserted or rehashed since the
+    last refresh are merged in by id. The window reaches back REFRESH_OVERLAP, so rows
+    whose transactions commit late are still picked up. Everything is reloaded every
+    FULL_RELOAD_INTERVAL as a backstop. Rows of deleted images stay until that reload,
+    so callers re-check matches in the database.
+    """
+
+    REFRESH_OVERLAP = timedelta(minutes=1)
+    FULL_RELOAD_INTERVAL = timedelta(hours=1)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reloaded_at = None
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.positions = {}
+        self.synced_at = None
+
+    def refresh(self, batch_size=100000):
+        """Merge in fingerprints added or updated since the last refresh"""
+        with self.lock:
+            now = datetime.utcnow()
+            if self.reloaded_at is None or now - self.reloaded_at > self.FULL_RELOAD_INTERVAL:
+                self._reset()
+                self.reloaded_at = now
+
+            query = db.session.query(ImageFingerprint.id, ImageFingerprint.user_id, ImageFingerprint.dhash)
+
+            if self.synced_at is None:
+                rows = query.yield_per(batch_size).all()
+                self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                self.user_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+                self.hashes = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows)).view(np.uint64)
+                self.positions = {fingerprint_id: index for index, fingerprint_id in enumerate(self.ids.tolist())}
+                self.synced_at = now
+                return
+
+            query = query.filter(ImageFingerprint.updated_at >= self.synced_at - self.REFRESH_OVERLAP)
+
+            new_ids, new_user_ids, new_hashes = [], [], []
+            for fingerprint_id, user_id, dhash in query.yield_per(batch_size):
+                dhash = np.int64(dhash).view(np.uint64)
+                position = self.positions.get(fingerprint_id)
+                if position is not None:
+                    self.user_ids[position] = user_id
+                    self.hashes[position] = dhash
+                else:
+                    self.positions[fingerprint_id] = len(self.ids) + len(new_ids)
+                    new_ids.append(fingerprint_id)
+                    new_user_ids.append(user_id)
+                    new_hashes.append(dhash)
+
+            if new_ids:
+                self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+                self.user_ids = np.concatenate([self.user_ids, np.array(new_user_ids, dtype=np.int64)])
+                self.hashes = np.concatenate([self.hashes, np.array(new_hashes, dtype=np.uint64)])
+
+            self.synced_at = now
+
+    def search(self, dhash, max_distance, limit=50, exclude_user_ids=()):
+        """(fingerprint id, distance) pairs within max_distance bits, closest first,
+        leaving out images owned by exclude_user_ids"""
+        self.refresh()
+
+        with self.lock:
+            ids, user_ids, hashes = self.ids, self.user_ids, self.hashes
+        if not len(ids):
+            return []
+
+        distances = hamming_distances(hashes, dhash)
+        candidates = distances <= max_distance
+        if exclude_user_ids:
+            candidates &= ~np.isin(user_ids, list(exclude_user_ids))
+
+        matches = np.flatnonzero(candidates)
+        matches = matches[np.argsort(distances[matches], kind='stable')][:limit]
+        return [(int(ids[index]), int(distances[index])) for index in matches]
+
+fingerprint_index = PerceptualHashIndex()
+
+def record_image_fingerprint(user_id, dhash, kind, media_id=None, verification_id=None):
+    """Insert or update the fingerprint of a media item or verification selfie.
+
+    The caller commits.
+    """
+    if media_id is not None:
+        fingerprint = ImageFingerprint.query.filter_by(media_id=media_id).first()
+    else:
+        fingerprint = ImageFingerprint.query.filter_by(verification_id=verification_id).first()
+
+    if fingerprint is None:
+        fingerprint = ImageFingerprint(media_id=media_id, verification_id=verification_id)
+        db.session.add(fingerprint)
+
+    fingerprint.user_id = user_id
+    fingerprint.kind = kind
+    fingerprint.dhash = to_signed(dhash)
+    return fingerprint
+
+def find_near_duplicates(fingerprints, max_distance=None, limit=50):
+    """Fingerprints of other users' images within max_distance bits of any given one.
+
+    Returns [{fingerprint, match, distance, user}] closest first, with the matched rows
+    and their owners loaded in two queries.
+    """
+    if max_distance is None:
+        max_distance = current_app.config['IMAGE_DUPLICATE_DISTANCE']
+
+    owners = {fingerprint.user_id for fingerprint in fingerprints}
+    best = {}
+    for fingerprint in fingerprints:
+        for match_id, distance in fingerprint_index.search(fingerprint.dhash, max_distance, limit, owners):
+            if distance < best.get(match_id, (max_distance + 1,))[0]:
+                best[match_id] = (distance, fingerprint)
+
+    if not best:
+        return []
+
+    matches = {
+        match.id: match for match in ImageFingerprint.query.filter(ImageFingerprint.id.in_(list(best))).all()
+        if match.user_id not in owners
+    }
+    users = {
+        user.id: user for user in User.query.filter(
+            User.id.in_({match.user_id for match in matches.values()})
+        ).all()
+    } if matches else {}
+
+    ordered = sorted(matches, key=lambda match_id: (best[match_id][0], match_id))[:limit]
+    return [
+        {
+            'fingerprint': best[match_id][1].to_dict(),
+            'match': matches[match_id].to_dict(),
+            'distance': best[match_id][0],
+            'user': users[matches[match_id].user_id].to_summary_dict()
+            if matches[match_id].user_id in users else None
+        }
+        for match_id in ordered
+    ]
+
+def backfill_image_fingerprints():
+    """Fingerprint images processed before the index existed, and verification selfies.
+
+    Runs in this process. Returns the number of fingerprints added.
+    """
+    from app.utils.media_processing import upload_url_to_path
+
+    added = 0
+
+    media = Media.query.outerjoin(ImageFingerprint, ImageFingerprint.media_id == Media.id) \
+        .filter(Media.media_type == 'image', ImageFingerprint.id.is_(None)) \
+        .order_by(Media.id).all()
+    for item in media:
+        try:
+            dhash = perceptual_hash(upload_url_to_path(item.file_path))
+        except (OSError, ValueError):
+            continue
+        record_image_fingerprint(
+            item.user_id, dhash, 'profile_picture' if item.is_profile_picture else 'media', media_id=item.id
+        )
+        added += 1
+
+    verifications = Verification.query \
+        .outerjoin(ImageFingerprint, ImageFingerprint.verification_id == Verification.id) \
+        .filter(Verification.selfie_image.isnot(None), ImageFingerprint.id.is_(None)) \
+        .order_by(Verification.id).all()
+    for verification in verifications:
+        try:
+            dhash = perceptual_hash(upload_url_to_path(verification.selfie_image))
+        except (OSError, ValueError):
+            continue
+        record_image_fingerprint(verification.user_id, dhash, 'selfie', verification_id=verification.id)
+        added += 1
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Media processing fingerprinted one of them concurrently; the next run picks up the rest
+        db.session.rollback()
+        return 0
+
+    return added
@@ -6,6 +6,9 @@ from app.models.match import Match
 from app.models.message import Message
 from app.models.media import Media, Comment, Like
 from app.models.subscription import Subscription
+from app.utils.counters import recount_media_counters
+from app.utils.trending import rebuild_trending_scores
+from app.utils.hashtags import backfill_hashtags
 
 def init_db():
     """Initialize the database with sample data for development"""
@@ -257,6 +260,11 @@ def init_db():
     
     db.session.commit()
     
+    # Sync denormalized like and comment counters with the sample data
+    recount_media_counters()
+    rebuild_trending_scores()
+    backfill_hashtags()
+    
     # Add a subscription for the premium user
     user1 = User.query.filter_by(email='user1@datify.com').first()
     if user1 and not Subscription.query.filter_by(user_id=user1.id).first():
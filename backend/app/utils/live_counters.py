@@ -0,0 +1,95 @@
+import threading
+from flask import current_app
+from redis.exceptions import ResponseError
+from app import db, socketio
+from app.models.media import Media
+from app.utils.background import start_periodic_job
+from app.utils.counters import shard_totals
+
+PENDING_LIVE_KEY = 'reels:live:pending'
+FLUSHING_LIVE_KEY = 'reels:live:flushing'
+BROADCAST_LOCK_KEY = 'reels:live:broadcast_lock'
+
+LIVE_COUNTER_KINDS = ('likes', 'comments', 'views')
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+def record_live_delta(media_id, kind, amount=1):
+    """Buffer a change to a reel's like, comment or view count for the next broadcast"""
+    if current_app.config['VIEW_COUNTER_BACKEND'] == 'redis':
+        from app import redis_client
+        redis_client.hincrby(PENDING_LIVE_KEY, f'{media_id}:{kind}', amount)
+    else:
+        with _pending_lock:
+            deltas = _pending.setdefault(media_id, {})
+            deltas[kind] = deltas.get(kind, 0) + amount
+
+    _ensure_broadcaster(current_app._get_current_object())
+
+def drain_live_deltas():
+    """Take buffered deltas as {media_id: {kind: delta}}"""
+    global _pending
+
+    if current_app.config['VIEW_COUNTER_BACKEND'] != 'redis':
+        with _pending_lock:
+            pending, _pending = _pending, {}
+        return pending
+
+    from app import redis_client
+
+    try:
+        redis_client.rename(PENDING_LIVE_KEY, FLUSHING_LIVE_KEY)
+    except ResponseError:
+        # RENAME fails when nothing is pending
+        return {}
+
+    pipe = redis_client.pipeline()
+    pipe.hgetall(FLUSHING_LIVE_KEY)
+    pipe.delete(FLUSHING_LIVE_KEY)
+    fields, _ = pipe.execute()
+
+    pending = {}
+    for field, amount in fields.items():
+        media_id, kind = field.decode().split(':', 1)
+        pending.setdefault(int(media_id), {})[kind] = int(amount)
+    return pending
+
+def broadcast_live_counters():
+    """Emit one summed `reel_counters` update to each reel room with pending changes"""
+    # view_count trails the deltas by up to VIEW_FLUSH_INTERVAL, since views are flushed in batches
+    pending = drain_live_deltas()
+    if not pending:
+        return 0
+
+    counts = {
+        row.id: row for row in db.session.query(
+            Media.id, Media.like_count, Media.comment_count, Media.view_count
+        ).filter(Media.id.in_(list(pending))).all()
+    }
+    offsets = shard_totals(list(counts))
+
+    for media_id, deltas in pending.items():
+        row = counts.get(media_id)
+        if row is None:
+            continue
+
+        offset = offsets.get(media_id, {})
+        socketio.emit('reel_counters', {
+            'reel_id': media_id,
+            'likes_count': (row.like_count or 0) + offset.get('like_count', 0),
+            'comments_count': (row.comment_count or 0) + offset.get('comment_count', 0),
+            'view_count': row.view_count or 0,
+            'deltas': {kind: deltas.get(kind, 0) for kind in LIVE_COUNTER_KINDS}
+        }, room=f'reel_{media_id}')
+
+    return len(pending)
+
+def _ensure_broadcaster(app):
+    """Start the broadcaster the first time a delta is recorded in this process"""
+    # Redis deltas are shared, so only one process may send them each interval
+    lock_key = BROADCAST_LOCK_KEY if app.config['VIEW_COUNTER_BACKEND'] == 'redis' else None
+    start_periodic_job(
+        app, broadcast_live_counters, app.config['LIVE_COUNTER_INTERVAL'],
+        'broadcast live reel counters', lock_key=lock_key
+    )
@@ -0,0 +1,66 @@
+import hashlib
+import os
+from functools import lru_cache
+from flask import current_app, send_file
+from werkzeug.security import safe_join
+
+UPLOAD_URL_PREFIX = '/static/uploads/'
+MEDIA_URL_PREFIX = '/media/'
+
+# Versioned URLs carry this many hex digits of the content hash
+VERSION_LENGTH = 16
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=4096)
+def _cached_digest(path, size, mtime_ns):
+    return sha256_file(path)
+
+def file_digest(path):
+    """Content hash of a file, cached for as long as its size and mtime are unchanged"""
+    stat = os.stat(path)
+    return _cached_digest(path, stat.st_size, stat.st_mtime_ns)
+
+def media_url(file_url, content_hash=None):
+    """Delivery URL for an uploaded file.
+
+    With a known content hash the URL is versioned (?v=...), which lets clients cache it
+    forever; without one clients revalidate with the ETag instead.
+    """
+    if not file_url or not file_url.startswith(UPLOAD_URL_PREFIX):
+        return file_url
+
+    url = MEDIA_URL_PREFIX + file_url[len(UPLOAD_URL_PREFIX):]
+    if content_hash:
+        url = f'{url}?v={content_hash[:VERSION_LENGTH]}'
+    return url
+
+def send_media_file(path, version=None):
+    """Send an upload with Range support, a strong content-hash ETag and cache headers.
+
+    send_file answers If-None-Match with 304 and Range with 206, and hands the open file
+    to the server's wsgi.file_wrapper, which gunicorn serves with sendfile(2) (or to the
+    front server when USE_X_SENDFILE is on). Immutable caching is only granted when the
+    requested version matches the file's current content.
+    """
+    digest = file_digest(path)
+    response = send_file(path, conditional=True, etag=digest, max_age=None)
+
+    if version and len(version) >= VERSION_LENGTH and digest.startswith(version):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+
+    return response
+
+def resolve_upload_path(filename):
+    """Absolute path of an upload under UPLOAD_FOLDER, or None if it escapes the folder"""
+    return safe_join(current_app.config['UPLOAD_FOLDER'], filename)
@@ -0,0 +1,276 @@
+import json
+import os
+import queue
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from PIL import Image, ImageOps
+from app import db, socketio
+from app.models.media import Media
+from app.models.user import User
+from app.utils.background import start_once
+from app.utils.image_index import perceptual_hash, record_image_fingerprint
+from app.utils.media_delivery import UPLOAD_URL_PREFIX, sha256_file
+from app.utils.notifications import notify, dispatch_notifications
+
+class PosterFrameBackend:
+    """Extracts a still frame and the duration of a video"""
+
+    def extract(self, video_path, output_path, offset):
+        """Write a JPEG frame near `offset` seconds to output_path and return the duration
+        in seconds, or None if it is unknown"""
+        raise NotImplementedError
+
+class FfmpegPosterFrameBackend(PosterFrameBackend):
+    """Poster frames via the ffprobe and ffmpeg command line tools"""
+
+    def extract(self, video_path, output_path, offset):
+        duration = None
+        probe = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', video_path],
+            capture_output=True, text=True, timeout=60
+        )
+        if probe.returncode == 0:
+            try:
+                duration = float(probe.stdout.strip())
+            except ValueError:
+                pass
+
+        # Short clips take their frame from the middle instead
+        if duration is not None:
+            offset = min(offset, duration / 2)
+
+        subprocess.run(
+            ['ffmpeg', '-y', '-v', 'error', '-ss', str(offset), '-i', video_path,
+             '-frames:v', '1', '-q:v', '2', output_path],
+            check=True, capture_output=True, timeout=120
+        )
+        return duration
+
+class StubPosterFrameBackend(PosterFrameBackend):
+    """Writes a blank frame without decoding the video, for tests and hosts without ffmpeg"""
+
+    size = (720, 1280)
+
+    def extract(self, video_path, output_path, offset):
+        Image.new('RGB', self.size, (24, 24, 24)).save(output_path, 'JPEG')
+        return None
+
+POSTER_FRAME_BACKENDS = {
+    'ffmpeg': FfmpegPosterFrameBackend,
+    'stub': StubPosterFrameBackend
+}
+
+# Worker side: these functions run in the process pool and must not touch the app or database
+
+def render_image_variants(source_path, output_dir, base_name, sizes, quality):
+    """Resize an image into progressive JPEGs no larger than each size (never upscaled).
+
+    Returns {name: {file, width, height, size, hash}} with file names relative to output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    variants = {}
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        for name, longest in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((longest, longest), Image.LANCZOS)
+
+            file_name = f'{base_name}_{name}.jpg'
+            path = os.path.join(output_dir, file_name)
+            variant.save(path, 'JPEG', quality=quality, optimize=True, progressive=True)
+
+            variants[name] = {
+                'file': file_name,
+                'width': variant.width,
+                'height': variant.height,
+                'size': os.path.getsize(path),
+                'hash': sha256_file(path)
+            }
+
+    return variants
+
+def process_image_job(source_path, output_dir, base_name, sizes, quality):
+    """Worker entry point for images; the perceptual hash feeds the duplicate image index"""
+    return {
+        'variants': render_image_variants(source_path, output_dir, base_name, sizes, quality),
+        'content_hash': sha256_file(source_path),
+        'dhash': perceptual_hash(source_path)
+    }
+
+def process_video_job(source_path, output_dir, base_name, sizes, quality, backend_name, offset):
+    """Worker entry point for reels: extract a poster frame, then resize it like an image"""
+    os.makedirs(output_dir, exist_ok=True)
+    poster_name = f'{base_name}_poster.jpg'
+    poster_path = os.path.join(output_dir, poster_name)
+
+    duration = POSTER_FRAME_BACKENDS[backend_name]().extract(source_path, poster_path, offset)
+    variants = render_image_variants(poster_path, output_dir, base_name, sizes, quality)
+
+    with Image.open(poster_path) as poster:
+        variants['poster'] = {
+            'file': poster_name,
+            'width': poster.width,
+            'height': poster.height,
+            'size': os.path.getsize(poster_path),
+            'hash': sha256_file(poster_path)
+        }
+
+    return {'variants': variants, 'duration': duration, 'content_hash': sha256_file(source_path)}
+
+# App side: queueing, dispatch to the pool and writing results back
+
+_jobs = queue.Queue()
+
+def upload_url_to_path(url):
+    """Map a /static/uploads/... URL to its file under UPLOAD_FOLDER"""
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        raise ValueError(f'Not an upload URL: {url}')
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], url[len(UPLOAD_URL_PREFIX):])
+
+def build_media_job(media):
+    """Worker function and arguments that process a media item.
+
+    Variants are written to a 'variants' folder next to the original.
+    """
+    source_path = upload_url_to_path(media.file_path)
+    output_dir = os.path.join(os.path.dirname(source_path), 'variants')
+    base_name = f'{media.id}_{os.path.splitext(os.path.basename(source_path))[0]}'
+    sizes = current_app.config['MEDIA_IMAGE_VARIANTS']
+    quality = current_app.config['MEDIA_IMAGE_QUALITY']
+
+    if media.media_type in ('reel', 'video'):
+        return process_video_job, (
+            source_path, output_dir, base_name, sizes, quality,
+            current_app.config['POSTER_FRAME_BACKEND'], current_app.config['POSTER_FRAME_OFFSET']
+        )
+
+    return process_image_job, (source_path, output_dir, base_name, sizes, quality)
+
+def enqueue_media_processing(media_id):
+    """Queue a committed media item for background processing"""
+    _jobs.put(media_id)
+    start_once(_dispatch_loop, current_app._get_current_object())
+
+def process_media_now(media):
+    """Process a media item synchronously in this process (used by the CLI)"""
+    function, args = build_media_job(media)
+    set_processing_status(media, 'processing')
+
+    try:
+        result = function(*args)
+    except Exception:
+        set_processing_status(media, 'failed')
+        raise
+
+    finish_media_job(media, result)
+
+def set_processing_status(media, status):
+    """Store a media item's processing status and report it to the owner"""
+    media.processing_status = status
+    db.session.commit()
+    report_processing_status(media)
+
+def finish_media_job(media, result):
+    """Write a worker result back to the media item (and the owner's profile picture and
+    image fingerprint)"""
+    folder = os.path.dirname(media.file_path)
+    variants = {}
+    for name, info in result['variants'].items():
+        variants[name] = {
+            'path': f"{folder}/variants/{info['file']}",
+            'width': info['width'],
+            'height': info['height'],
+            'size': info['size'],
+            'hash': info['hash']
+        }
+
+    media.variants = json.dumps(variants)
+    media.content_hash = result['content_hash']
+
+    if 'thumb' in variants and (media.media_type != 'reel' or not media.thumbnail_path):
+        media.thumbnail_path = variants['thumb']['path']
+
+    if result.get('duration') and not media.duration:
+        media.duration = round(result['duration'])
+
+    if result.get('dhash') is not None:
+        record_image_fingerprint(
+            media.user_id, result['dhash'], 'profile_picture' if media.is_profile_picture else 'media',
+            media_id=media.id
+        )
+
+    # Profile pictures are shown in every list, so serve the medium rendition there
+    if media.is_profile_picture and 'medium' in variants:
+        User.query.filter_by(id=media.user_id, profile_picture=media.file_path) \
+            .update({User.profile_picture: variants['medium']['path']}, synchronize_session=False)
+
+    set_processing_status(media, 'ready')
+
+def report_processing_status(media):
+    """Tell the owner's clients how processing of their upload is going"""
+    notify(media.user_id, 'media_processing', {
+        'media_id': media.id,
+        'status': media.processing_status,
+        'thumbnail_path': media.thumbnail_path,
+        'variants': media.get_variants()
+    })
+    dispatch_notifications()
+
+def _dispatch_loop(app):
+    """Keep up to MEDIA_PROCESSING_WORKERS jobs running in the process pool.
+
+    The loop only polls futures and yields with socketio.sleep, so it never blocks the
+    server's event loop while images are decoded and resized in the workers.
+    """
+    workers = app.config['MEDIA_PROCESSING_WORKERS']
+    executor = ProcessPoolExecutor(max_workers=workers)
+    in_flight = {}
+
+    while True:
+        while len(in_flight) < workers:
+            try:
+                media_id = _jobs.get_nowait()
+            except queue.Empty:
+                break
+
+            with app.app_context():
+                try:
+                    media = Media.query.get(media_id)
+                    if media is None:
+                        continue
+
+                    function, args = build_media_job(media)
+                    future = executor.submit(function, *args)
+                    in_flight[future] = media_id
+                    set_processing_status(media, 'processing')
+                except BrokenProcessPool:
+                    app.logger.warning('Media processing pool broke; restarting it')
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    _jobs.put(media_id)
+                    break
+                except Exception:
+                    app.logger.exception('Failed to start processing media %s', media_id)
+
+        for future in [future for future in in_flight if future.done()]:
+            media_id = in_flight.pop(future)
+
+            with app.app_context():
+                media = Media.query.get(media_id)
+                if media is None:
+                    continue
+
+                try:
+                    finish_media_job(media, future.result())
+                except Exception:
+                    app.logger.exception('Failed to process media %s', media_id)
+                    db.session.rollback()
+                    set_processing_status(media, 'failed')
+
+        socketio.sleep(0.2)
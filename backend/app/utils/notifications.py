@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+from flask import g
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app import db, socketio
+from app.models.notification import Notification, NotificationCounter
+
+def notify(user_id, event, data):
+    """Queue a notification for a user.
+
+    Queued notifications are stored and emitted together by dispatch_notifications, so a
+    request that notifies several users costs one insert statement.
+    """
+    g.setdefault('pending_notifications', []).append((user_id, event, data))
+
+def dispatch_notifications():
+    """Persist queued notifications in one batch, then emit them to the users' rooms"""
+    pending = g.pop('pending_notifications', [])
+    if not pending:
+        return []
+
+    by_user = {}
+    for user_id, event, data in pending:
+        by_user.setdefault(user_id, []).append((event, data))
+
+    deliveries = []
+    # Lock counters in a fixed order so concurrent batches cannot deadlock
+    for user_id, items in sorted(by_user.items()):
+        last_seq = reserve_sequence(user_id, len(items))
+        first_seq = last_seq - len(items) + 1
+
+        for offset, (event, data) in enumerate(items):
+            deliveries.append((user_id, first_seq + offset, event, data))
+
+    now = datetime.utcnow()
+    db.session.execute(insert(Notification), [
+        {
+            'user_id': user_id,
+            'seq': seq,
+            'event': event,
+            'payload': json.dumps(data),
+            'created_at': now
+        }
+        for user_id, seq, event, data in deliveries
+    ])
+    db.session.commit()
+
+    # Emit only after commit so a reconnecting client can never miss a sequence number
+    for user_id, seq, event, data in deliveries:
+        socketio.emit(event, dict(data, seq=seq), room=f'user_{user_id}')
+
+    return deliveries
+
+def reserve_sequence(user_id, count):
+    """Allocate `count` sequence numbers for a user and return the last one.
+
+    The counter row is incremented in place, so concurrent writers for the same user are
+    serialized by the row lock and never hand out the same number twice.
+    """
+    updated = NotificationCounter.query.filter_by(user_id=user_id).update(
+        {NotificationCounter.last_seq: NotificationCounter.last_seq + count},
+        synchronize_session=False
+    )
+
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(NotificationCounter(user_id=user_id, last_seq=count))
+            return count
+        except IntegrityError:
+            # Another writer created the counter first
+            return reserve_sequence(user_id, count)
+
+    return db.session.query(NotificationCounter.last_seq).filter_by(user_id=user_id).scalar()
+
+def get_notifications_since(user_id, since_seq, limit=500):
+    """Get notifications after the client's last seen sequence, oldest first.
+
+    Returns (notifications, has_more).
+    """
+    notifications = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.seq > since_seq
+    ).order_by(Notification.seq).limit(limit + 1).all()
+
+    return notifications[:limit], len(notifications) > limit
+
+def get_last_sequence(user_id):
+    """Latest sequence number allocated to a user (0 if none)"""
+    return db.session.query(NotificationCounter.last_seq).filter_by(user_id=user_id).scalar() or 0
+
+def prune_notifications(older_than):
+    """Delete stored notifications created before `older_than`"""
+    deleted = Notification.query.filter(Notification.created_at < older_than) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
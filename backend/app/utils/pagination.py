@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+
+def encode_cursor(values):
+    """Encode keyset values into an opaque, URL-safe cursor token"""
+    payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token produced by encode_cursor.
+
+    Returns None for an empty token and raises ValueError if the token is malformed.
+    """
+    if not token:
+        return None
+
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def paginate_keyset(query, columns, cursor=None, limit=20, key=None):
+    """Fetch one page of `query` ordered descending by `columns`.
+
+    Rows after the cursor are selected with a row-value comparison on the same columns,
+    so every page is an index range read with no COUNT or OFFSET, and rows inserted
+    while a client scrolls cannot shift later pages. `key` maps a result row to its
+    column values (default: the attributes named like the columns).
+
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    # A page holds at least one row, or there is no last row to continue after
+    limit = max(limit, 1)
+    values = decode_cursor(cursor)
+
+    if values is not None:
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('Invalid cursor')
+        values = [_load_key_value(column, value) for column, value in zip(columns, values)]
+        query = query.filter(tuple_(*columns) < tuple_(*values))
+
+    items = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    if key is None:
+        key = lambda item: [getattr(item, column.key) for column in columns]
+
+    return items, encode_cursor([_dump_key_value(value) for value in key(items[-1])])
+
+def _dump_key_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _load_key_value(column, value):
+    try:
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value)
+        return column.type.python_type(value)
+    except (TypeError, ValueError, NotImplementedError) as e:
+        raise ValueError('Invalid cursor') from e
@@ -0,0 +1,202 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.models.user import UserBlocked, UserLike
+from app.models.match import Match
+from app.models.media import Media, Like, MediaHashtag, TrendingScore
+from app.utils.trending import decay_exponent
+
+CANDIDATES_KEY = 'feed:{}:candidates'
+SEEN_KEY = 'feed:{}:seen'
+
+# Recent likes whose hashtags describe a viewer's interests, and how many hashtags to use
+INTEREST_LIKES = 200
+INTEREST_HASHTAGS = 20
+
+def blocked_user_ids(user_id):
+    """Ids of users the viewer blocked or was blocked by, in one query"""
+    rows = db.session.query(UserBlocked.user_id, UserBlocked.blocked_id).filter(
+        (UserBlocked.user_id == user_id) | (UserBlocked.blocked_id == user_id)
+    ).all()
+    return {blocked_id if blocker_id == user_id else blocker_id for blocker_id, blocked_id in rows}
+
+def _social_user_ids(user_id):
+    """Users the viewer liked ('follow') and users they matched with ('match')"""
+    followed = {
+        liked_id for (liked_id,) in db.session.query(UserLike.liked_id)
+        .filter(UserLike.liker_id == user_id).all()
+    }
+    matched = {
+        user1_id if user2_id == user_id else user2_id
+        for user1_id, user2_id in db.session.query(Match.user1_id, Match.user2_id).filter(
+            ((Match.user1_id == user_id) | (Match.user2_id == user_id)) & (Match.is_active == True)
+        ).all()
+    }
+    return followed, matched
+
+def _interest_hashtag_ids(user_id):
+    """Hashtags that appear most on the reels the viewer liked recently"""
+    recent_likes = select(Like.media_id).where(Like.user_id == user_id) \
+        .order_by(Like.created_at.desc()).limit(INTEREST_LIKES).subquery()
+
+    rows = db.session.query(MediaHashtag.hashtag_id) \
+        .join(recent_likes, recent_likes.c.media_id == MediaHashtag.media_id) \
+        .group_by(MediaHashtag.hashtag_id) \
+        .order_by(func.count().desc()) \
+        .limit(INTEREST_HASHTAGS).all()
+    return [hashtag_id for (hashtag_id,) in rows]
+
+def build_feed_candidates(user_id):
+    """Rank candidate reels for a viewer and cache their ids in Redis.
+
+    Candidates come from reels by users the viewer liked or matched with, reels tagged
+    with the hashtags of reels they liked, and the trending table. Each is ranked by its
+    trending score (log2 space, so recency is built in) plus a log2 boost for the best
+    source it came from (FEED_SOURCE_BOOSTS). Reels by blocked users, private reels, the
+    viewer's own and ones they liked or have already been shown are left out.
+
+    Returns the number of candidates cached.
+    """
+    from app import redis_client
+
+    config = current_app.config
+    limit = config['FEED_CANDIDATE_LIMIT']
+    boosts = config['FEED_SOURCE_BOOSTS']
+    since = datetime.utcnow() - config['FEED_CANDIDATE_WINDOW']
+
+    excluded_users = blocked_user_ids(user_id) | {user_id}
+    base = db.session.query(Media.id, Media.created_at, TrendingScore.score) \
+        .outerjoin(TrendingScore, TrendingScore.media_id == Media.id) \
+        .filter(
+            Media.media_type == 'reel',
+            Media.is_private == False,
+            ~Media.user_id.in_(excluded_users),
+            ~Media.id.in_(select(Like.media_id).where(Like.user_id == user_id))
+        )
+
+    followed, matched = _social_user_ids(user_id)
+    hashtag_ids = _interest_hashtag_ids(user_id)
+
+    sources = []
+    for name, user_ids in (('match', matched), ('follow', followed)):
+        if user_ids:
+            sources.append((name, base.filter(Media.user_id.in_(user_ids), Media.created_at >= since)
+                            .order_by(Media.created_at.desc())))
+    if hashtag_ids:
+        sources.append(('hashtag', base.join(MediaHashtag, MediaHashtag.media_id == Media.id)
+                        .filter(MediaHashtag.hashtag_id.in_(hashtag_ids), Media.created_at >= since)
+                        .order_by(MediaHashtag.created_at.desc())))
+    sources.append(('trending', base.filter(TrendingScore.score.isnot(None))
+                    .order_by(TrendingScore.score.desc())))
+
+    seen = {int(media_id) for media_id in redis_client.smembers(SEEN_KEY.format(user_id))}
+    ranked = {}
+
+    for name, query in sources:
+        for media_id, created_at, score in query.limit(limit).all():
+            if media_id in seen:
+                continue
+            # Reels nobody engaged with yet rank like one unit of engagement at creation
+            rank = (score if score is not None else decay_exponent(created_at)) + boosts.get(name, 0)
+            ranked[media_id] = max(rank, ranked.get(media_id, rank))
+
+    candidates = sorted(ranked, key=lambda media_id: (ranked[media_id], media_id), reverse=True)[:limit]
+
+    key = CANDIDATES_KEY.format(user_id)
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    if candidates:
+        pipe.rpush(key, *candidates)
+        pipe.expire(key, config['FEED_CANDIDATE_TTL'])
+    pipe.execute()
+
+    return len(candidates)
+
+def _pop_candidates(user_id, count):
+    """Atomically take up to `count` ids off the front of a viewer's candidate list"""
+    from app import redis_client
+
+    key = CANDIDATES_KEY.format(user_id)
+    pipe = redis_client.pipeline()
+    pipe.lrange(key, 0, count - 1)
+    pipe.ltrim(key, count, -1)
+    ids, _ = pipe.execute()
+    return [int(media_id) for media_id in ids]
+
+def peek_feed_ids(user_id, count):
+    """The next `count` candidate ids without taking them, building the cache if needed"""
+    from app import redis_client
+
+    key = CANDIDATES_KEY.format(user_id)
+    ids = redis_client.lrange(key, 0, count - 1)
+    if not ids and build_feed_candidates(user_id):
+        ids = redis_client.lrange(key, 0, count - 1)
+    return [int(media_id) for media_id in ids]
+
+def _unseen(user_id, media_ids):
+    """Drop ids already shown to the viewer (on another device since the list was built)"""
+    from app import redis_client
+
+    if not media_ids:
+        return []
+
+    pipe = redis_client.pipeline()
+    for media_id in media_ids:
+        pipe.sismember(SEEN_KEY.format(user_id), media_id)
+    return [media_id for media_id, seen in zip(media_ids, pipe.execute()) if not seen]
+
+def next_feed_ids(user_id, count):
+    """Pop the next `count` unseen candidate ids, rebuilding the cache once if it runs dry.
+
+    Popped ids are recorded as seen. Returns (ids, has_more).
+    """
+    from app import redis_client
+
+    ids = []
+    rebuilt = False
+
+    while len(ids) < count:
+        popped = _pop_candidates(user_id, count - len(ids))
+        if not popped:
+            if rebuilt or not build_feed_candidates(user_id):
+                break
+            rebuilt = True
+            continue
+        ids.extend(media_id for media_id in _unseen(user_id, popped) if media_id not in ids)
+
+    if ids:
+        seen_key = SEEN_KEY.format(user_id)
+        pipe = redis_client.pipeline()
+        pipe.sadd(seen_key, *ids)
+        pipe.expire(seen_key, current_app.config['FEED_SEEN_TTL'])
+        pipe.execute()
+
+    has_more = bool(redis_client.llen(CANDIDATES_KEY.format(user_id)))
+    return ids, has_more
+
+def hydrate_feed(user_id, media_ids):
+    """Load popped reels in one query, in feed order, dropping any deleted, made private
+    or posted by users blocked since the candidates were built"""
+    if not media_ids:
+        return []
+
+    excluded_users = blocked_user_ids(user_id)
+    reels = {
+        reel.id: reel for reel in Media.query.filter(
+            Media.id.in_(media_ids),
+            Media.media_type == 'reel',
+            Media.is_private == False
+        ).all()
+        if reel.user_id not in excluded_users
+    }
+    return [reels[media_id] for media_id in media_ids if media_id in reels]
+
+def reset_feed(user_id, forget_seen=False):
+    """Drop a viewer's cached candidates (and optionally their seen history)"""
+    from app import redis_client
+
+    keys = [CANDIDATES_KEY.format(user_id)]
+    if forget_seen:
+        keys.append(SEEN_KEY.format(user_id))
+    redis_client.delete(*keys)
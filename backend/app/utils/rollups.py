@@ -0,0 +1,151 @@
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import defer
+from app import db
+from app.models.user import User
+from app.models.match import Match
+from app.models.message import Message, MessageArchiveSegment
+from app.models.media import Media, Report
+from app.models.subscription import Transaction
+from app.models.stats import DailyStats
+from app.utils.archive import decompress_segment
+from app.utils.background import start_periodic_job
+
+ROLLUP_LOCK_KEY = 'stats:rollup_lock'
+
+# Days recomputed per statement when backfilling long ranges
+BACKFILL_CHUNK_DAYS = 31
+
+EMPTY_DAY = {
+    'new_users': 0,
+    'new_matches': 0,
+    'new_messages': 0,
+    'new_reels': 0,
+    'new_reports': 0,
+    'revenue': 0.0
+}
+
+def _day(value):
+    """date() of a grouped day, which SQLite returns as a string"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _daily(column, aggregate, start, end, *conditions):
+    """{day: aggregate} of rows whose `column` falls in [start, end), in one grouped query"""
+    day = func.date(column)
+    rows = db.session.query(day, aggregate) \
+        .filter(column >= start, column < end, *conditions) \
+        .group_by(day).all()
+    return {_day(value): total for value, total in rows}
+
+def _archived_daily_messages(start, end):
+    """{day: count} of archived messages created in [start, end)"""
+    # Only segments spanning several days need decompressing
+    segments = MessageArchiveSegment.query.options(defer(MessageArchiveSegment.payload)).filter(
+        MessageArchiveSegment.last_created_at >= start,
+        MessageArchiveSegment.first_created_at < end
+    ).all()
+
+    counts = {}
+    for segment in segments:
+        day = segment.first_created_at.date()
+        if day == segment.last_created_at.date():
+            counts[day] = counts.get(day, 0) + segment.message_count
+            continue
+
+        for record in decompress_segment(segment):
+            created_at = datetime.fromisoformat(record['created_at'])
+            if start <= created_at < end:
+                counts[created_at.date()] = counts.get(created_at.date(), 0) + 1
+
+    return counts
+
+def rollup_days(start_day, end_day):
+    """Recompute the daily_stats rows of [start_day, end_day); returns the number of days written"""
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+
+    new_messages = _daily(Message.created_at, func.count(Message.id), start, end)
+    for day, count in _archived_daily_messages(start, end).items():
+        new_messages[day] = new_messages.get(day, 0) + count
+
+    metrics = {
+        'new_users': _daily(User.created_at, func.count(User.id), start, end),
+        'new_matches': _daily(Match.created_at, func.count(Match.id), start, end),
+        'new_messages': new_messages,
+        'new_reels': _daily(Media.created_at, func.count(Media.id), start, end, Media.media_type == 'reel'),
+        'new_reports': _daily(Report.created_at, func.count(Report.id), start, end),
+        'revenue': _daily(Transaction.created_at, func.sum(Transaction.amount), start, end,
+                          Transaction.status == 'completed')
+    }
+
+    DailyStats.query.filter(DailyStats.day >= start_day, DailyStats.day < end_day) \
+        .delete(synchronize_session=False)
+
+    rows = []
+    day = start_day
+    while day < end_day:
+        row = {name: values.get(day) or 0 for name, values in metrics.items()}
+        row['revenue'] = float(row['revenue'])
+        rows.append(dict(row, day=day, updated_at=datetime.utcnow()))
+        day += timedelta(days=1)
+
+    db.session.bulk_insert_mappings(DailyStats, rows)
+    db.session.commit()
+    return len(rows)
+
+def rollup_recent_days(today=None):
+    """Recompute today and the previous STATS_ROLLUP_LOOKBACK_DAYS days, which may still change"""
+    today = today or datetime.utcnow().date()
+    start_day = today - timedelta(days=current_app.config['STATS_ROLLUP_LOOKBACK_DAYS'])
+    return rollup_days(start_day, today + timedelta(days=1))
+
+def backfill_rollups(start_day, end_day=None):
+    """Roll up history from start_day to today in chunks; returns the number of days written"""
+    end_day = end_day or datetime.utcnow().date() + timedelta(days=1)
+    written = 0
+
+    while start_day < end_day:
+        chunk_end = min(start_day + timedelta(days=BACKFILL_CHUNK_DAYS), end_day)
+        written += rollup_days(start_day, chunk_end)
+        start_day = chunk_end
+
+    return written
+
+def first_activity_day():
+    """Day of the earliest user, the natural start of a full backfill"""
+    first = db.session.query(func.min(User.created_at)).scalar()
+    return first.date() if first else datetime.utcnow().date()
+
+def get_daily_series(start_day, end_day):
+    """Daily totals for [start_day, end_day) from the rollup table, zero for days not rolled up yet"""
+    stored = {
+        row.day: row for row in DailyStats.query.filter(
+            DailyStats.day >= start_day, DailyStats.day < end_day
+        ).all()
+    }
+
+    series = []
+    day = start_day
+    while day < end_day:
+        row = stored.get(day)
+        series.append(row.to_dict() if row else dict(EMPTY_DAY, date=day.isoformat()))
+        day += timedelta(days=1)
+
+    return series
+
+def register_rollup_job(app):
+    """Start the periodic rollup with the first request when STATS_ROLLUP_INTERVAL is set"""
+    if not app.config['STATS_ROLLUP_INTERVAL']:
+        return
+
+    @app.before_request
+    def start_rollup_job():
+        start_periodic_job(
+            app, rollup_recent_days, app.config['STATS_ROLLUP_INTERVAL'], 'roll up daily stats',
+            lock_key=ROLLUP_LOCK_KEY
+        )
@@ -0,0 +1,245 @@
+import re
+from sqlalchemy import DDL, Float, Integer, event, literal, or_, select, text, bindparam
+from app import db
+
+# SQLite keeps an external-content FTS5 table in sync with `messages` through triggers.
+SQLITE_MESSAGE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+# Postgres uses an expression GIN index, so every insert or update is indexed by the database itself.
+POSTGRES_MESSAGE_FTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages "
+    "USING GIN (to_tsvector('english', coalesce(content, '')))",
+]
+
+SQLITE_MESSAGE_SEARCH_SQL = """
+    SELECT id, score, snippet FROM (
+        SELECT m.id AS id,
+               -bm25(messages_fts) AS score,
+               snippet(messages_fts, 0, '<mark>', '</mark>', '...', 12) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH :query AND m.match_id IN :match_ids
+    )
+    WHERE (:cursor_score IS NULL OR score < :cursor_score OR (score = :cursor_score AND id < :cursor_id))
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+"""
+
+POSTGRES_MESSAGE_SEARCH_SQL = """
+    SELECT id, score, snippet FROM (
+        SELECT m.id AS id,
+               ts_rank(to_tsvector('english', coalesce(m.content, '')), q)::float8 AS score,
+               ts_headline('english', coalesce(m.content, ''), q,
+                           'StartSel=<mark>, StopSel=</mark>, MaxWords=12, MinWords=4, MaxFragments=1') AS snippet
+        FROM messages m, websearch_to_tsquery('english', :query) q
+        WHERE to_tsvector('english', coalesce(m.content, '')) @@ q AND m.match_id IN :match_ids
+    ) ranked
+    WHERE (CAST(:cursor_score AS DOUBLE PRECISION) IS NULL OR score < :cursor_score OR (score = :cursor_score AND id < :cursor_id))
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+"""
+
+def register_message_search_ddl(table):
+    """Attach the dialect specific full-text DDL to the messages table"""
+    for statement in SQLITE_MESSAGE_FTS_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    for statement in POSTGRES_MESSAGE_FTS_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+def rebuild_message_search_index():
+    """Create the message search index on an existing database and reindex all rows"""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_MESSAGE_FTS_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_MESSAGE_FTS_DDL:
+            db.session.execute(text(statement))
+
+    db.session.commit()
+    return dialect
+
+def build_fts5_query(term):
+    """Turn free text into a safe FTS5 query: quoted tokens, last token prefix-matched"""
+    tokens = [token.replace('"', '""') for token in term.split() if token.strip('"')]
+    if not tokens:
+        return None
+
+    parts = [f'"{token}"' for token in tokens]
+    parts[-1] += '*'
+    return ' '.join(parts)
+
+def search_messages(term, match_ids, limit=20, cursor=None):
+    """Rank messages in the given matches against a search term.
+
+    Returns a list of (message_id, score, snippet) rows ordered by relevance, starting
+    after the (score, id) position in `cursor` when one is given.
+    """
+    if not match_ids or not term or not term.strip():
+        return []
+
+    dialect = db.engine.dialect.name
+    cursor_score, cursor_id = cursor if cursor else (None, None)
+
+    if dialect == 'sqlite':
+        sql = SQLITE_MESSAGE_SEARCH_SQL
+        query = build_fts5_query(term)
+        if query is None:
+            return []
+    elif dialect == 'postgresql':
+        sql = POSTGRES_MESSAGE_SEARCH_SQL
+        query = term
+    else:
+        return _search_messages_fallback(term, match_ids, limit, cursor_id)
+
+    statement = text(sql).bindparams(bindparam('match_ids', expanding=True))
+    rows = db.session.execute(statement, {
+        'query': query,
+        'match_ids': list(match_ids),
+        'cursor_score': cursor_score,
+        'cursor_id': cursor_id,
+        'limit': limit
+    })
+
+    return [(row.id, row.score, row.snippet) for row in rows]
+
+def _search_messages_fallback(term, match_ids, limit, cursor_id):
+    """Unindexed substring search for databases without a full-text backend"""
+    from app.models.message import Message
+
+    query = Message.query.filter(
+        Message.match_id.in_(match_ids),
+        Message.content.ilike(f'%{term}%')
+    )
+
+    if cursor_id is not None:
+        query = query.filter(Message.id < cursor_id)
+
+    messages = query.order_by(Message.id.desc()).limit(limit).all()
+    return [(message.id, 0.0, message.content) for message in messages]
+
+# Users are searched by name and email from the admin UI. unicode61 splits emails and
+# usernames on '@', '.' and '_', and the prefix indexes keep typeahead queries cheap.
+SQLITE_USER_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "username, email, first_name, last_name, content='users', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, username, email, first_name, last_name) "
+    "VALUES (new.id, new.username, new.email, new.first_name, new.last_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, username, email, first_name, last_name) "
+    "VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email, first_name, last_name "
+    "ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, username, email, first_name, last_name) "
+    "VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name); "
+    "INSERT INTO users_fts(rowid, username, email, first_name, last_name) "
+    "VALUES (new.id, new.username, new.email, new.first_name, new.last_name); END",
+]
+
+# Weighted so a username hit outranks a name hit, which outranks an email hit. The
+# 'simple' configuration keeps names unstemmed; '@' and '.' are blanked so the parts of
+# an address are separate words. Queries must use this exact expression to hit the index.
+POSTGRES_USER_TSVECTOR = (
+    "setweight(to_tsvector('simple', coalesce(username, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'B') || "
+    "setweight(to_tsvector('simple', translate(coalesce(email, ''), '@.', '  ')), 'C')"
+)
+
+POSTGRES_USER_FTS_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_users_search_tsv ON users USING GIN (({POSTGRES_USER_TSVECTOR}))",
+]
+
+# FTS5 column weights, in table order: username, email, first_name, last_name
+SQLITE_USER_SEARCH_SQL = """
+    SELECT rowid AS id, -bm25(users_fts, 10.0, 2.0, 5.0, 5.0) AS score
+    FROM users_fts
+    WHERE users_fts MATCH :query
+"""
+
+POSTGRES_USER_SEARCH_SQL = f"""
+    SELECT id, ts_rank({POSTGRES_USER_TSVECTOR}, to_tsquery('simple', :query))::float8 AS score
+    FROM users
+    WHERE ({POSTGRES_USER_TSVECTOR}) @@ to_tsquery('simple', :query)
+"""
+
+def register_user_search_ddl(table):
+    """Attach the dialect specific full-text DDL to the users table"""
+    for statement in SQLITE_USER_FTS_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    for statement in POSTGRES_USER_FTS_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+def rebuild_user_search_index():
+    """Create the user search index on an existing database and reindex all rows"""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_USER_FTS_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_USER_FTS_DDL:
+            db.session.execute(text(statement))
+
+    db.session.commit()
+    return dialect
+
+def build_prefix_tsquery(term):
+    """Turn free text into a safe tsquery: words ANDed, last word prefix-matched"""
+    words = re.findall(r'[^\W_]+', term.lower())
+    if not words:
+        return None
+
+    words[-1] += ':*'
+    return ' & '.join(words)
+
+def ranked_user_search(term):
+    """Subquery of (id, score) for users matching a search term, best match highest.
+
+    Every word of the term must match a word of the username, name or email, the last
+    one as a prefix, so it can back a search-as-you-type box. Join it to a User query
+    and page on (score, id). Returns None when the term has nothing to search for.
+    """
+    from app.models.user import User
+
+    if not term or not term.strip():
+        return None
+
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        sql = SQLITE_USER_SEARCH_SQL
+        query = build_fts5_query(term)
+    elif dialect == 'postgresql':
+        sql = POSTGRES_USER_SEARCH_SQL
+        query = build_prefix_tsquery(term)
+    else:
+        # Unindexed prefix match for databases without a full-text backend
+        prefix = f'{term.strip()}%'
+        return select(User.id.label('id'), literal(0.0, Float).label('score')).where(or_(
+            User.username.ilike(prefix),
+            User.email.ilike(prefix),
+            User.first_name.ilike(prefix),
+            User.last_name.ilike(prefix)
+        )).subquery('ranked_users')
+
+    if query is None:
+        return None
+
+    return text(sql).bindparams(query=query) \
+        .columns(id=Integer, score=Float) \
+        .subquery('ranked_users')
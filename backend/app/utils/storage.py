@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from app import db
+from app.models.storage import StoredFile
+from app.models.user import User
+from app.utils.media_delivery import UPLOAD_URL_PREFIX, sha256_file
+from app.utils.upload_validation import ValidatingFileStream
+
+OBJECTS_FOLDER = 'objects'
+# Session.info key of the objects released in the current transaction
+PENDING_UNLINKS = 'storage_pending_unlinks'
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+def object_path(digest, extension):
+    """Relative path of a content-addressed file, fanned out over two directory levels
+    so no directory holds more than a small slice of all uploads"""
+    return f'{OBJECTS_FOLDER}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+def file_extension(filename):
+    """Lowercase extension (with dot) of an uploaded file name"""
+    return os.path.splitext(secure_filename(filename or ''))[1].lower()
+
+def store_upload(file):
+    """Store an uploaded FileStorage, hashing it while it is streamed to disk.
+
+    Returns the StoredFile, with its reference count already taken for the caller.
+    The caller commits.
+    """
+    if isinstance(file.stream, ValidatingFileStream):
+        # Already streamed to a temp file and hashed while the request was parsed
+        stream = file.stream
+        return _add_object(stream.detach(), stream.hexdigest(), stream.size, file_extension(file.filename))
+
+    temp_folder = current_app.config['STORAGE_TEMP_FOLDER']
+    os.makedirs(temp_folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+
+    temp = tempfile.NamedTemporaryFile(dir=temp_folder, delete=False)
+    try:
+        with temp:
+            for chunk in iter(lambda: file.stream.read(STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp.name)
+        raise
+
+    return _add_object(temp.name, digest.hexdigest(), size, file_extension(file.filename))
+
+def store_local_file(path, filename, digest=None):
+    """Store a file already on disk (such as a finished chunked upload), moving it.
+
+    Pass `digest` when the file's SHA-256 has already been verified to skip rehashing.
+    """
+    digest = digest or sha256_file(path)
+    return _add_object(path, digest, os.path.getsize(path), file_extension(filename))
+
+def _add_object(source_path, digest, size, extension):
+    """Take a reference on the object for `digest`, moving source_path into place if the
+    content is new and discarding it otherwise"""
+    stored = _take_reference(digest)
+
+    if stored is None:
+        relative_path = object_path(digest, extension)
+        _move_into_place(source_path, relative_path)
+
+        try:
+            with db.session.begin_nested():
+                stored = StoredFile(sha256=digest, path=relative_path, size=size, ref_count=1)
+                db.session.add(stored)
+            return stored
+        except IntegrityError:
+            # Another upload of the same content won the insert; the bytes are identical
+            stored = _take_reference(digest)
+            if stored is not None:
+                return stored
+            raise
+
+    # Restore the file if it went missing (an interrupted release)
+    if not os.path.exists(_absolute_path(stored.path)):
+        _move_into_place(source_path, stored.path)
+    else:
+        os.remove(source_path)
+
+    return stored
+
+def _take_reference(digest):
+    """Increment the reference count of an existing object; None if there is none"""
+    updated = StoredFile.query.filter_by(sha256=digest).update(
+        {StoredFile.ref_count: StoredFile.ref_count + 1},
+        synchronize_session=False
+    )
+
+    if not updated:
+        return None
+
+    stored = db.session.get(StoredFile, digest)
+    db.session.refresh(stored)
+    return stored
+
+def release_file(url):
+    """Drop one reference to the stored file behind `url`, deleting it with the last one.
+
+    URLs that are not content-addressed (legacy uploads, generated variants) are ignored.
+    A profile picture shares its Media item's reference, so an object still named by a
+    user's profile_picture is kept on its last release; the upload GC collects it once
+    no user names it. The file is unlinked only after the caller commits the row delete,
+    so a rolled-back transaction never leaves rows pointing at a missing file. The caller
+    commits.
+    """
+    prefix = f'{UPLOAD_URL_PREFIX}{OBJECTS_FOLDER}/'
+    if not url or not url.startswith(prefix):
+        return False
+
+    digest = os.path.splitext(os.path.basename(url))[0]
+
+    StoredFile.query.filter_by(sha256=digest).update(
+        {StoredFile.ref_count: StoredFile.ref_count - 1},
+        synchronize_session=False
+    )
+
+    stored = StoredFile.query.filter(StoredFile.sha256 == digest, StoredFile.ref_count <= 0).first()
+    if stored is None:
+        return False
+
+    if db.session.query(User.query.filter(User.profile_picture == url).exists()).scalar():
+        return False
+
+    db.session.delete(stored)
+    db.session.flush()
+    db.session.info.setdefault(PENDING_UNLINKS, []).append((digest, stored.path))
+
+    return True
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_released_files(session):
+    """Delete the files of objects whose last reference was released in the committed
+    transaction"""
+    pending = session.info.pop(PENDING_UNLINKS, None)
+    if not pending:
+        return
+
+    # An upload of the same content may have stored the object again since the commit
+    with db.engine.connect() as connection:
+        live = set(connection.execute(
+            select(StoredFile.sha256).where(StoredFile.sha256.in_([digest for digest, _ in pending]))
+        ).scalars())
+
+    for digest, path in pending:
+        if digest in live:
+            continue
+        try:
+            os.remove(_absolute_path(path))
+        except FileNotFoundError:
+            pass
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_released_files(session):
+    """Keep the files of a rolled-back release; their rows are restored too"""
+    session.info.pop(PENDING_UNLINKS, None)
+
+def release_media_files(media):
+    """Release the stored original and thumbnail of a media item being deleted"""
+    release_file(media.file_path)
+    if media.thumbnail_path != media.file_path:
+        release_file(media.thumbnail_path)
+
+def _absolute_path(relative_path):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+
+def _move_into_place(source_path, relative_path):
+    target = _absolute_path(relative_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # A plain rename when STORAGE_TEMP_FOLDER is on the upload filesystem
+    shutil.move(source_path, target)
+    # Renames keep the source mtime; a fresh one keeps the upload GC's grace period honest
+    os.utime(target)
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from app import db
+from app.models.user import User
+from app.models.match import Match
+from app.models.message import Message
+from app.utils.pagination import encode_cursor, decode_cursor
+
+# Rows committed slightly after the previous sync started are caught by re-reading this window
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def parse_sync_token(token):
+    """Decode a sync token into (since, last_message_id); (None, 0) starts a fresh sync"""
+    values = decode_cursor(token)
+    if values is None:
+        return None, 0
+
+    try:
+        return datetime.fromisoformat(values['t']), int(values['m'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid sync token') from e
+
+def serialize_match_page(matches, user_id):
+    """Serialize matches for a user with a constant number of queries.
+
+    The other participants and the newest message of every match are each loaded for
+    the whole page in one query.
+    """
+    if not matches:
+        return []
+
+    other_ids = {match.user2_id if match.user1_id == user_id else match.user1_id for match in matches}
+    users = {other.id: other for other in User.query.filter(User.id.in_(other_ids)).all()}
+
+    # Message ids grow with created_at, so the newest message of a match has its highest id
+    latest_ids = select(func.max(Message.id)).where(
+        Message.match_id.in_([match.id for match in matches])
+    ).group_by(Message.match_id)
+    last_messages = {
+        message.match_id: message for message in Message.query.filter(Message.id.in_(latest_ids)).all()
+    }
+
+    return [
+        match.to_dict(
+            user_id,
+            other_user=users.get(match.user2_id if match.user1_id == user_id else match.user1_id),
+            last_messages=last_messages
+        )
+        for match in matches
+    ]
+
+def build_sync_delta(user, token=None, message_limit=500):
+    """Collect everything that changed for a user since the sync token.
+
+    Matches, unmatches and profiles are selected by updated_at, new messages by id, and read
+    watermarks by read_at. Without a token only matches and profiles are returned, plus a
+    token positioned at the latest message. Items near the token boundary may be repeated,
+    so clients should apply the delta idempotently by id.
+    """
+    since, last_message_id = parse_sync_token(token)
+    started_at = datetime.utcnow()
+
+    user_matches = (Match.user1_id == user.id) | (Match.user2_id == user.id)
+
+    # Ids and participants of every match scope the message and profile queries
+    match_rows = Match.query.with_entities(
+        Match.id, Match.user1_id, Match.user2_id, Match.is_active
+    ).filter(user_matches).all()
+    match_ids = [row.id for row in match_rows]
+
+    changed_query = Match.query.filter(user_matches)
+    if since is not None:
+        changed_query = changed_query.filter(Match.updated_at >= since - SYNC_OVERLAP)
+    changed_matches = changed_query.all() if match_ids else []
+
+    messages = []
+    read_watermarks = []
+    has_more = False
+
+    if since is None:
+        # A fresh sync starts at the latest message; history is loaded through the chat API
+        if match_ids:
+            last_message_id = db.session.query(func.max(Message.id)).filter(
+                Message.match_id.in_(match_ids)
+            ).scalar() or 0
+    elif match_ids:
+        messages = Message.query.filter(
+            Message.match_id.in_(match_ids),
+            Message.id > last_message_id
+        ).order_by(Message.id).limit(message_limit + 1).all()
+
+        has_more = len(messages) > message_limit
+        messages = messages[:message_limit]
+        if messages:
+            last_message_id = messages[-1].id
+
+        # Highest message read by each participant, for messages read since the last sync
+        read_watermarks = [
+            {'match_id': row.match_id, 'reader_id': row.recipient_id, 'message_id': row.message_id}
+            for row in db.session.query(
+                Message.match_id,
+                Message.recipient_id,
+                func.max(Message.id).label('message_id')
+            ).filter(
+                Message.match_id.in_(match_ids),
+                Message.read_at >= since - SYNC_OVERLAP
+            ).group_by(Message.match_id, Message.recipient_id).all()
+        ]
+
+    # Profiles of matched users that changed, and the user's own profile
+    profile_ids = {user.id} | {
+        row.user2_id if row.user1_id == user.id else row.user1_id
+        for row in match_rows if row.is_active
+    }
+    profile_query = User.query.filter(User.id.in_(profile_ids))
+    if since is not None:
+        profile_query = profile_query.filter(User.updated_at >= since - SYNC_OVERLAP)
+    profiles = profile_query.all()
+
+    # When messages were truncated the timestamp must not advance past unseen changes
+    next_since = since if has_more else started_at
+
+    return {
+        'matches': serialize_match_page([match for match in changed_matches if match.is_active], user.id),
+        'unmatches': [match.id for match in changed_matches if not match.is_active],
+        'messages': [message.to_dict() for message in messages],
+        'read_watermarks': read_watermarks,
+        'profiles': [profile.to_dict() if profile.id == user.id else profile.to_summary_dict() for profile in profiles],
+        'has_more': has_more,
+        'sync_token': encode_cursor({'t': next_since.isoformat(), 'm': last_message_id})
+    }
@@ -0,0 +1,212 @@
+import math
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.media import Media, Comment, Like, TrendingScore
+
+PENDING_TRENDING_KEY = 'trending:pending'
+FLUSHING_TRENDING_KEY = 'trending:flushing'
+REFRESH_LOCK_KEY = 'trending:refresh_lock'
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+def decay_exponent(at):
+    """log2 weight of one unit of engagement at time `at` relative to TRENDING_EPOCH"""
+    elapsed = (at - current_app.config['TRENDING_EPOCH']).total_seconds()
+    return elapsed / current_app.config['TRENDING_HALF_LIFE'].total_seconds()
+
+def initial_score(created_at):
+    """Score of a reel nobody engaged with yet: one unit of engagement at its creation"""
+    return decay_exponent(created_at)
+
+def log2_add(a, b):
+    """log2(2**a + 2**b) without overflowing"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+def record_engagement(media_id, kind, amount=1):
+    """Buffer weighted engagement for a reel until the next trending refresh"""
+    # Imported here because the flusher imports this module
+    from app.utils.views import ensure_flusher
+
+    weight = current_app.config['TRENDING_WEIGHTS'][kind] * amount
+    if weight <= 0:
+        return
+
+    # Workers that see likes and comments but no views must refresh trending too
+    ensure_flusher(current_app._get_current_object())
+
+    if current_app.config['VIEW_COUNTER_BACKEND'] == 'redis':
+        from app import redis_client
+        redis_client.hincrbyfloat(PENDING_TRENDING_KEY, media_id, weight)
+        return
+
+    with _pending_lock:
+        _pending[media_id] = _pending.get(media_id, 0) + weight
+
+def record_engagements(weights):
+    """Buffer pre-weighted engagement for many reels at once ({media_id: weight})"""
+    if not weights:
+        return
+
+    if current_app.config['VIEW_COUNTER_BACKEND'] == 'redis':
+        from app import redis_client
+        pipe = redis_client.pipeline()
+        for media_id, weight in weights.items():
+            pipe.hincrbyfloat(PENDING_TRENDING_KEY, media_id, weight)
+        pipe.execute()
+        return
+
+    with _pending_lock:
+        for media_id, weight in weights.items():
+            _pending[media_id] = _pending.get(media_id, 0) + weight
+
+def _drain_pending(use_redis):
+    """Take buffered engagement as {media_id: weight}"""
+    global _pending
+
+    if not use_redis:
+        with _pending_lock:
+            pending, _pending = _pending, {}
+        return pending
+
+    from app import redis_client
+    from redis.exceptions import ResponseError
+
+    if not redis_client.exists(FLUSHING_TRENDING_KEY):
+        try:
+            redis_client.rename(PENDING_TRENDING_KEY, FLUSHING_TRENDING_KEY)
+        except ResponseError:
+            return {}
+
+    return {
+        int(media_id): float(weight)
+        for media_id, weight in redis_client.hgetall(FLUSHING_TRENDING_KEY).items()
+    }
+
+def refresh_trending_scores(now=None):
+    """Fold buffered engagement into the trending table.
+
+    Only reels with new engagement are touched: each delta is added in log2 space at the
+    current decay exponent, which ranks it above the same amount of older engagement.
+    Returns the number of reels updated.
+    """
+    use_redis = current_app.config['VIEW_COUNTER_BACKEND'] == 'redis'
+
+    if use_redis:
+        from app import redis_client
+        if not redis_client.set(REFRESH_LOCK_KEY, 1, nx=True, ex=60):
+            return 0
+
+    try:
+        pending = _drain_pending(use_redis)
+        if not pending:
+            return 0
+
+        exponent = decay_exponent(now or datetime.utcnow())
+        deltas = {
+            media_id: math.log2(weight) + exponent
+            for media_id, weight in pending.items() if weight > 0
+        }
+
+        try:
+            _apply_score_deltas(deltas)
+        except IntegrityError:
+            # A concurrent refresh inserted one of the rows first; retry on the next tick
+            db.session.rollback()
+            if not use_redis:
+                record_engagements(pending)
+            return 0
+
+        if use_redis:
+            redis_client.delete(FLUSHING_TRENDING_KEY)
+
+        return len(deltas)
+    finally:
+        if use_redis:
+            redis_client.delete(REFRESH_LOCK_KEY)
+
+def _apply_score_deltas(deltas):
+    """Add log2-space deltas to existing scores and create rows for new reels"""
+    existing = {
+        row.media_id: row
+        for row in TrendingScore.query.filter(TrendingScore.media_id.in_(list(deltas))).all()
+    }
+
+    # Deleted reels may still have buffered engagement
+    live_ids = {
+        row.id for row in Media.query.with_entities(Media.id).filter(Media.id.in_(list(deltas))).all()
+    }
+
+    for media_id, delta in deltas.items():
+        if media_id not in live_ids:
+            continue
+
+        row = existing.get(media_id)
+        if row:
+            row.score = log2_add(row.score, delta)
+        else:
+            db.session.add(TrendingScore(media_id=media_id, score=delta))
+
+    db.session.commit()
+
+def rebuild_trending_scores():
+    """Recompute every reel's score from its likes, comments and views.
+
+    Likes and comments are decayed from their own timestamps; views, which have no event
+    log, are credited at the reel's creation time on top of its initial score. Returns
+    the number of reels scored.
+    """
+    weights = current_app.config['TRENDING_WEIGHTS']
+    scores = {}
+
+    def add(media_id, weight, at):
+        if weight > 0 and at is not None:
+            scores[media_id] = log2_add(scores.get(media_id), math.log2(weight) + decay_exponent(at))
+
+    reels = Media.query.with_entities(Media.id, Media.view_count, Media.created_at) \
+        .filter(Media.media_type == 'reel').yield_per(1000)
+    for row in reels:
+        add(row.id, 1, row.created_at)
+        add(row.id, weights['view'] * (row.view_count or 0), row.created_at)
+
+    # Engagement is bucketed by hour so the rebuild reads aggregates rather than every row
+    for model, kind in ((Like, 'like'), (Comment, 'comment')):
+        hour = func.strftime('%Y-%m-%d %H:00:00', model.created_at) \
+            if db.engine.dialect.name == 'sqlite' else func.date_trunc('hour', model.created_at)
+        rows = db.session.query(model.media_id, hour.label('hour'), func.count(model.id)) \
+            .join(Media, Media.id == model.media_id) \
+            .filter(Media.media_type == 'reel') \
+            .group_by(model.media_id, hour).yield_per(1000)
+        for media_id, bucket, count in rows:
+            if isinstance(bucket, str):
+                bucket = datetime.fromisoformat(bucket)
+            add(media_id, weights[kind] * count, bucket)
+
+    TrendingScore.query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(TrendingScore, [
+        {'media_id': media_id, 'score': score, 'updated_at': datetime.utcnow()}
+        for media_id, score in scores.items()
+    ])
+    db.session.commit()
+    return len(scores)
+
+def backfill_trending_scores():
+    """Give reels without a trending row their initial score. Returns the number of reels scored."""
+    missing = db.session.query(Media.id, Media.created_at) \
+        .outerjoin(TrendingScore, TrendingScore.media_id == Media.id) \
+        .filter(Media.media_type == 'reel', TrendingScore.media_id.is_(None)).all()
+
+    db.session.bulk_insert_mappings(TrendingScore, [
+        {'media_id': row.id, 'score': initial_score(row.created_at or datetime.utcnow()),
+         'updated_at': datetime.utcnow()}
+        for row in missing
+    ])
+    db.session.commit()
+    return len(missing)
@@ -0,0 +1,174 @@
+import heapq
+import os
+import time
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models.user import User, Verification
+from app.models.media import Media
+from app.models.message import ChatAttachment
+from app.models.storage import StoredFile
+from app.utils.background import start_periodic_job
+from app.utils.media_delivery import UPLOAD_URL_PREFIX
+
+GC_LOCK_KEY = 'uploads:gc_lock'
+
+def walk_upload_tree(root):
+    """Yield (relative_path, stat) for every file under root in byte-wise sorted order"""
+    # Directories are sorted with a trailing '/' so the walk matches sorting full paths
+    def walk(directory, prefix):
+        with os.scandir(directory) as scan:
+            entries = sorted(
+                (entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name, entry)
+                for entry in scan
+            )
+
+        for key, entry in entries:
+            if key.endswith('/'):
+                yield from walk(entry.path, prefix + key)
+            elif entry.is_file(follow_symlinks=False):
+                yield prefix + entry.name, entry.stat(follow_symlinks=False)
+
+    if os.path.isdir(root):
+        yield from walk(root, '')
+
+def _binary_order(column):
+    """Order a string column by raw bytes, matching Python's str ordering"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return column.collate('C')
+    if dialect == 'mysql':
+        return column.collate('utf8mb4_bin')
+    return column
+
+def _url_references(column, batch_size):
+    """Sorted upload-relative paths referenced by a URL column"""
+    rows = db.session.query(column) \
+        .filter(column.like(f'{UPLOAD_URL_PREFIX}%')) \
+        .order_by(_binary_order(column)) \
+        .yield_per(batch_size)
+
+    for (url,) in rows:
+        yield url[len(UPLOAD_URL_PREFIX):]
+
+def _stored_file_references(batch_size):
+    """Sorted paths of content-addressed files that are still referenced"""
+    rows = db.session.query(StoredFile.path) \
+        .filter(StoredFile.ref_count > 0) \
+        .order_by(_binary_order(StoredFile.path)) \
+        .yield_per(batch_size)
+
+    for (path,) in rows:
+        yield path
+
+def referenced_paths(batch_size=1000):
+    """Merge every source of upload references into one sorted, de-duplicated stream"""
+    streams = [
+        _url_references(Media.file_path, batch_size),
+        _url_references(Media.thumbnail_path, batch_size),
+        _url_references(ChatAttachment.file_path, batch_size),
+        _url_references(User.profile_picture, batch_size),
+        _url_references(Verification.selfie_image, batch_size),
+        _url_references(Verification.id_image, batch_size),
+        _stored_file_references(batch_size)
+    ]
+
+    previous = None
+    for path in heapq.merge(*streams):
+        if path != previous:
+            yield path
+            previous = path
+
+def _variant_owner_id(path):
+    """Media id encoded in a generated variant's file name, or None for other files"""
+    directory, name = os.path.split(path)
+    if os.path.basename(directory) != 'variants':
+        return None
+
+    owner = name.split('_', 1)[0]
+    return int(owner) if owner.isdigit() else None
+
+def collect_orphaned_uploads(grace=None, dry_run=False, batch_size=1000):
+    """Delete upload files that nothing references any more and return a report of counts"""
+    # Uploads may be on disk before their row commits, hence the grace period
+    grace = grace if grace is not None else current_app.config['UPLOAD_GC_GRACE']
+    cutoff = time.time() - grace.total_seconds()
+    excluded = tuple(current_app.config['UPLOAD_GC_EXCLUDE'])
+    root = current_app.config['UPLOAD_FOLDER']
+
+    report = {
+        'scanned_files': 0,
+        'scanned_bytes': 0,
+        'deleted_files': 0,
+        'reclaimed_bytes': 0,
+        'kept_recent': 0,
+        'started_at': datetime.utcnow().isoformat()
+    }
+
+    # Merge-join the sorted tree against the sorted references, in bounded memory
+    references = referenced_paths(batch_size)
+    reference = next(references, None)
+    candidates = []
+
+    for path, stat in walk_upload_tree(root):
+        report['scanned_files'] += 1
+        report['scanned_bytes'] += stat.st_size
+
+        while reference is not None and reference < path:
+            reference = next(references, None)
+
+        if reference == path or path.startswith(excluded):
+            continue
+
+        if stat.st_mtime > cutoff:
+            report['kept_recent'] += 1
+            continue
+
+        candidates.append((path, stat.st_size))
+        if len(candidates) >= batch_size:
+            _delete_orphans(root, candidates, report, dry_run)
+            candidates = []
+
+    if candidates:
+        _delete_orphans(root, candidates, report, dry_run)
+
+    return report
+
+def _delete_orphans(root, candidates, report, dry_run):
+    """Delete a batch of unreferenced files, sparing variants of existing media"""
+    owner_ids = {owner for owner in (_variant_owner_id(path) for path, _ in candidates) if owner}
+    live_owners = {
+        row.id for row in Media.query.with_entities(Media.id).filter(Media.id.in_(owner_ids)).all()
+    } if owner_ids else set()
+
+    for path, size in candidates:
+        if _variant_owner_id(path) in live_owners:
+            continue
+
+        if not dry_run:
+            try:
+                os.remove(os.path.join(root, path))
+            except FileNotFoundError:
+                continue
+
+        report['deleted_files'] += 1
+        report['reclaimed_bytes'] += size
+
+def register_upload_gc(app):
+    """Start the periodic collector with the first request when UPLOAD_GC_INTERVAL is set"""
+    if not app.config['UPLOAD_GC_INTERVAL']:
+        return
+
+    @app.before_request
+    def start_upload_gc():
+        start_periodic_job(
+            app, _collect_uploads, app.config['UPLOAD_GC_INTERVAL'], 'collect orphaned uploads',
+            lock_key=GC_LOCK_KEY
+        )
+
+def _collect_uploads():
+    report = collect_orphaned_uploads()
+    current_app.logger.info(
+        'Upload GC deleted %s of %s files, reclaiming %s bytes',
+        report['deleted_files'], report['scanned_files'], report['reclaimed_bytes']
+    )
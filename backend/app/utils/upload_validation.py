@@ -0,0 +1,182 @@
+import hashlib
+import os
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# Bytes needed to recognise every supported format
+SNIFF_LENGTH = 16
+
+# Content types recognised from magic bytes, and the extensions allowed to claim them
+EXTENSION_TYPES = {
+    'jpg': 'jpeg',
+    'jpeg': 'jpeg',
+    'png': 'png',
+    'gif': 'gif',
+    'webp': 'webp',
+    'mp4': 'isobmff',
+    'mov': 'isobmff',
+    'avi': 'avi',
+    'mp3': 'mp3',
+    'wav': 'wav',
+    'ogg': 'ogg',
+    'pdf': 'pdf'
+}
+
+TYPE_CATEGORIES = {
+    'jpeg': 'image',
+    'png': 'image',
+    'gif': 'image',
+    'webp': 'image',
+    'isobmff': 'video',
+    'avi': 'video',
+    'mp3': 'audio',
+    'wav': 'audio',
+    'ogg': 'audio',
+    'pdf': 'document'
+}
+
+# Top-level ISO base media atoms a QuickTime or MP4 file can start with
+ISOBMFF_ATOMS = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+
+def sniff_type(header):
+    """Identify a file format from its first bytes; None if it is not a supported one"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF':
+        return {b'WEBP': 'webp', b'AVI ': 'avi', b'WAVE': 'wav'}.get(header[8:12])
+    if header[4:8] in ISOBMFF_ATOMS:
+        return 'isobmff'
+    if header.startswith(b'ID3') or (len(header) > 1 and header[0] == 0xff and header[1] & 0xe0 == 0xe0):
+        return 'mp3'
+    if header.startswith(b'OggS'):
+        return 'ogg'
+    if header.startswith(b'%PDF-'):
+        return 'pdf'
+    return None
+
+def bare_extension(filename):
+    """Lowercase extension of a file name without the dot"""
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+def allowed_extension(filename, allowed_extensions=None):
+    """Check a file name's extension, for uploads whose content has not arrived yet"""
+    if allowed_extensions is None:
+        allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+
+    return bare_extension(filename) in allowed_extensions
+
+def check_magic(filename, header):
+    """Raise UnsupportedMediaType unless the bytes are the format the extension claims"""
+    expected = EXTENSION_TYPES.get(bare_extension(filename))
+    detected = sniff_type(header)
+
+    if expected is None or detected != expected:
+        raise UnsupportedMediaType('File content does not match its type')
+
+    return detected
+
+def max_file_size(filename):
+    """Largest accepted size for a file of this name's category"""
+    category = TYPE_CATEGORIES.get(EXTENSION_TYPES.get(bare_extension(filename)))
+    return current_app.config['UPLOAD_MAX_FILE_SIZE'].get(category, current_app.config['MAX_CONTENT_LENGTH'])
+
+class ValidatingFileStream:
+    """Temp file a multipart file part is streamed into, checked as it arrives.
+
+    The first SNIFF_LENGTH bytes are matched against the file name's extension and the
+    running size against the category limit, so a bad upload is rejected while the body
+    is still being received. The content is hashed on the way in so the storage layer
+    does not have to read it again. The file is deleted on close unless detached.
+    """
+
+    def __init__(self, filename, max_size, folder):
+        os.makedirs(folder, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=folder)
+        self.file = os.fdopen(fd, 'w+b')
+        self.filename = filename
+        self.max_size = max_size
+        self.size = 0
+        self.header = b''
+        self.kind = None
+        self.sha256 = hashlib.sha256()
+        self.detached = False
+        # Empty file inputs arrive as parts without a file name; routes reject those
+        self.validate = bool(filename)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.validate and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge('File too large')
+
+        if self.validate and self.kind is None:
+            self.header += data[:SNIFF_LENGTH - len(self.header)]
+            if len(self.header) >= SNIFF_LENGTH:
+                self._check_magic()
+
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def seek(self, offset, whence=0):
+        # The parser seeks back to the start once the part is complete
+        if self.validate and self.kind is None:
+            self._check_magic()
+        return self.file.seek(offset, whence)
+
+    def _check_magic(self):
+        # A rejected part never reaches request.files, so nothing else would close it
+        try:
+            self.kind = check_magic(self.filename, self.header)
+        except UnsupportedMediaType:
+            self.close()
+            raise
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def detach(self):
+        """Hand the temp file over to the caller, which becomes responsible for it"""
+        self.file.close()
+        self.detached = True
+        return self.name
+
+    def close(self):
+        if self.detached:
+            return
+        self.file.close()
+        try:
+            os.remove(self.name)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class UploadRequest(Request):
+    """Request whose multipart file parts are validated while they stream to disk"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ValidatingFileStream(
+            filename,
+            max_file_size(filename),
+            current_app.config['STORAGE_TEMP_FOLDER']
+        )
+
+def allowed_upload(file, allowed_extensions=None):
+    """Check an uploaded FileStorage by extension and by its sniffed content"""
+    if not allowed_extension(file.filename, allowed_extensions):
+        return False
+
+    stream = file.stream
+    if isinstance(stream, ValidatingFileStream):
+        return stream.kind == EXTENSION_TYPES.get(bare_extension(file.filename))
+
+    # Streams not created by UploadRequest are sniffed directly
+    header = stream.read(SNIFF_LENGTH)
+    stream.seek(0)
+    return sniff_type(header) == EXTENSION_TYPES.get(bare_extension(file.filename))
@@ -0,0 +1,185 @@
+import threading
+import time
+from flask import current_app
+from redis.exceptions import ResponseError
+from sqlalchemy import update, bindparam
+from app import db
+from app.models.media import Media
+from app.utils.background import start_periodic_job
+from app.utils.counters import fold_counter_shards
+from app.utils.trending import record_engagements, refresh_trending_scores
+
+PENDING_VIEWS_KEY = 'media:views:pending'
+FLUSHING_VIEWS_KEY = 'media:views:flushing'
+FLUSH_LOCK_KEY = 'media:views:flush_lock'
+
+class ShardedViewBuffer:
+    """In-process view counter split across independently locked shards.
+
+    Requests for different reels rarely touch the same lock, and the flusher swaps each
+    shard out in O(1), so recording a view never waits on the database.
+    """
+
+    def __init__(self, shards=16):
+        self.shards = [({}, set(), threading.Lock()) for _ in range(shards)]
+
+    def add(self, media_id, viewer_id=None):
+        """Count a view, ignoring repeats by the same viewer within one flush interval"""
+        counts, viewers, lock = self.shards[media_id % len(self.shards)]
+
+        with lock:
+            if viewer_id is not None:
+                key = (media_id, viewer_id)
+                if key in viewers:
+                    return False
+                viewers.add(key)
+            counts[media_id] = counts.get(media_id, 0) + 1
+        return True
+
+    def drain(self):
+        """Take all pending counts, leaving empty shards behind"""
+        pending = {}
+        for index in range(len(self.shards)):
+            lock = self.shards[index][2]
+            with lock:
+                counts = self.shards[index][0]
+                self.shards[index] = ({}, set(), lock)
+            for media_id, count in counts.items():
+                pending[media_id] = pending.get(media_id, 0) + count
+        return pending
+
+    def restore(self, pending):
+        """Put drained counts back after a failed flush"""
+        for media_id, count in pending.items():
+            counts, _, lock = self.shards[media_id % len(self.shards)]
+            with lock:
+                counts[media_id] = counts.get(media_id, 0) + count
+
+view_buffer = ShardedViewBuffer()
+
+def record_view(media_id, viewer_id=None):
+    """Buffer a view of a media item; counts are written back by flush_view_counts"""
+    if current_app.config['VIEW_COUNTER_BACKEND'] == 'redis':
+        counted = _record_view_redis(media_id, viewer_id)
+    else:
+        counted = view_buffer.add(media_id, viewer_id)
+
+    ensure_flusher(current_app._get_current_object())
+    return counted
+
+def _record_view_redis(media_id, viewer_id):
+    """Count a view in Redis, deduplicating viewers per time window with HyperLogLog"""
+    from app import redis_client
+
+    if viewer_id is not None:
+        window = current_app.config['VIEW_DEDUP_WINDOW']
+        bucket = int(time.time()) // window
+        viewers_key = f'media:viewers:{media_id}:{bucket}'
+
+        pipe = redis_client.pipeline()
+        pipe.pfadd(viewers_key, viewer_id)
+        pipe.expire(viewers_key, window)
+        is_new, _ = pipe.execute()
+
+        if not is_new:
+            return False
+
+    redis_client.hincrby(PENDING_VIEWS_KEY, media_id, 1)
+    return True
+
+def drain_pending_views():
+    """Take pending view counts from the configured backend as {media_id: count}"""
+    if current_app.config['VIEW_COUNTER_BACKEND'] != 'redis':
+        return view_buffer.drain()
+
+    from app import redis_client
+
+    # Counts left over from a flush that failed are retried before new ones are taken
+    if not redis_client.exists(FLUSHING_VIEWS_KEY):
+        try:
+            redis_client.rename(PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY)
+        except ResponseError:
+            # RENAME fails when nothing is pending
+            return {}
+
+    return {
+        int(media_id): int(count)
+        for media_id, count in redis_client.hgetall(FLUSHING_VIEWS_KEY).items()
+    }
+
+def flush_view_counts():
+    """Write buffered views back with one batched `view_count = view_count + n` UPDATE.
+
+    Returns the number of media rows updated.
+    """
+    use_redis = current_app.config['VIEW_COUNTER_BACKEND'] == 'redis'
+
+    if use_redis:
+        from app import redis_client
+
+        # Only one process may flush the shared hash at a time
+        if not redis_client.set(FLUSH_LOCK_KEY, 1, nx=True, ex=60):
+            return 0
+
+    try:
+        return _flush_pending_views(use_redis)
+    finally:
+        if use_redis:
+            redis_client.delete(FLUSH_LOCK_KEY)
+
+def _flush_pending_views(use_redis):
+    """Drain pending views and apply them in one executemany UPDATE"""
+    pending = drain_pending_views()
+
+    if pending:
+        media = Media.__table__
+        statement = update(media) \
+            .where(media.c.id == bindparam('media_id')) \
+            .values(
+                view_count=db.func.coalesce(media.c.view_count, 0) + bindparam('views'),
+                # Views are not content changes, so keep updated_at as it is
+                updated_at=media.c.updated_at
+            )
+
+        try:
+            db.session.execute(statement, [
+                {'media_id': media_id, 'views': count} for media_id, count in pending.items()
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if not use_redis:
+                view_buffer.restore(pending)
+            raise
+
+        # Flushed views feed the trending scores on their next refresh
+        weight = current_app.config['TRENDING_WEIGHTS']['view']
+        record_engagements({media_id: count * weight for media_id, count in pending.items()})
+
+    if use_redis:
+        from app import redis_client
+        redis_client.delete(FLUSHING_VIEWS_KEY)
+
+    return len(pending)
+
+def ensure_flusher(app):
+    """Start the periodic flusher the first time this process buffers a counter write"""
+    start_periodic_job(app, _flush_buffers, app.config['VIEW_FLUSH_INTERVAL'], 'flush buffered counters')
+
+def _flush_buffers():
+    """Flush buffered views, fold counter shards and refresh trending scores"""
+    try:
+        flush_view_counts()
+    except Exception:
+        current_app.logger.exception('Failed to flush buffered view counts')
+
+    try:
+        fold_counter_shards()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Failed to fold counter shards')
+
+    try:
+        refresh_trending_scores()
+    except Exception:
+        current_app.logger.exception('Failed to refresh trending scores')
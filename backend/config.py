@@ -1,5 +1,5 @@
 import os
-from datetime import timedelta
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -53,6 +53,71 @@ class Config:
     UPLOAD_FOLDER = os.path.join(basedir, 'app/static/uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4'}
+    UPLOAD_MAX_FILE_SIZE = {'image': 10 * 1024 * 1024}  # per category; others are capped by MAX_CONTENT_LENGTH
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() in ['true', 'on', '1']  # Let the front server send /media files
+    
+    # Content-addressed storage: uploads are hashed into this folder before being moved into place
+    STORAGE_TEMP_FOLDER = os.path.join(basedir, 'upload_tmp')  # Outside the static folder
+    
+    # Orphaned upload collection
+    UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL', 0))  # seconds; 0 runs it only from the CLI
+    UPLOAD_GC_GRACE = timedelta(hours=24)  # Files modified more recently are never collected
+    UPLOAD_GC_EXCLUDE = ['chat_attachments/', 'default/']  # Legacy attachments may be referenced only by archived messages
+    
+    # Chunked upload configuration
+    CHUNKED_UPLOAD_FOLDER = os.path.join(basedir, 'upload_chunks')  # Outside the static folder
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # 4 MB per chunk request
+    CHUNKED_UPLOAD_MAX_SIZE = {
+        'reel': 512 * 1024 * 1024,  # 512 MB
+        'chat_attachment': 64 * 1024 * 1024  # 64 MB
+    }
+    UPLOAD_SESSION_TTL = timedelta(hours=24)
+    
+    # Message archive configuration
+    MESSAGE_ARCHIVE_AFTER = timedelta(days=int(os.environ.get('MESSAGE_ARCHIVE_AFTER_DAYS', 180)))
+    MESSAGE_ARCHIVE_SEGMENT_SIZE = 500  # messages per compressed segment
+    
+    # Notification inbox configuration
+    NOTIFICATION_RETENTION = timedelta(days=30)
+    
+    # View counter configuration
+    VIEW_COUNTER_BACKEND = os.environ.get('VIEW_COUNTER_BACKEND', 'memory')  # 'memory' or 'redis'
+    VIEW_FLUSH_INTERVAL = 5  # seconds between batched view_count writes
+    VIEW_DEDUP_WINDOW = 3600  # seconds a viewer is counted once per reel (Redis backend)
+    LIVE_COUNTER_INTERVAL = 1.0  # seconds between coalesced count updates to reel rooms
+    MEDIA_COUNTER_HOT_THRESHOLD = 50  # like/comment writes per second that shard a media item's counters (0 disables)
+    MEDIA_COUNTER_SHARDS = 16  # shard rows per sharded counter
+    MEDIA_COUNTER_HOT_TTL = 300  # seconds a media item stays sharded after its rate last passed the threshold
+    
+    # Trending configuration
+    TRENDING_EPOCH = datetime(2024, 1, 1)
+    TRENDING_HALF_LIFE = timedelta(hours=24)
+    TRENDING_WEIGHTS = {'view': 1.0, 'like': 4.0, 'comment': 6.0}
+    
+    # Personalized reels feed configuration
+    FEED_CANDIDATE_LIMIT = 500  # candidate reels cached per viewer (and read per source)
+    FEED_CANDIDATE_TTL = 900  # seconds before a viewer's candidates are rebuilt
+    FEED_CANDIDATE_WINDOW = timedelta(days=14)  # age of reels taken from follows, matches and hashtags
+    FEED_SEEN_TTL = 7 * 24 * 3600  # seconds a shown reel is kept out of the feed
+    FEED_SOURCE_BOOSTS = {'match': 3.0, 'follow': 2.0, 'hashtag': 1.0, 'trending': 0.0}  # log2 rank boosts
+    
+    # Media processing configuration
+    MEDIA_PROCESSING_WORKERS = int(os.environ.get('MEDIA_PROCESSING_WORKERS', 2))
+    MEDIA_IMAGE_VARIANTS = {'thumb': 320, 'medium': 720, 'large': 1080}  # longest side in pixels
+    MEDIA_IMAGE_QUALITY = 82  # JPEG quality of resized variants
+    POSTER_FRAME_BACKEND = os.environ.get('POSTER_FRAME_BACKEND', 'ffmpeg')  # 'ffmpeg' or 'stub'
+    POSTER_FRAME_OFFSET = 1.0  # seconds into the video
+    
+    # Admin dashboard configuration
+    ADMIN_STATS_TTL = 600  # seconds a dashboard snapshot is kept
+    ADMIN_STATS_REFRESH = 60  # age in seconds after which a served snapshot is recomputed in the background
+    
+    # Daily stats rollup configuration
+    STATS_ROLLUP_INTERVAL = int(os.environ.get('STATS_ROLLUP_INTERVAL', 900))  # seconds between rollups (0 disables)
+    STATS_ROLLUP_LOOKBACK_DAYS = 2  # settled days recomputed with today on every rollup
+    
+    # Moderation configuration
+    IMAGE_DUPLICATE_DISTANCE = 8  # dHash bits two images may differ by and still be duplicates
     
     # Geolocation configuration
     GEOLOCATION_API_KEY = os.environ.get('GEOLOCATION_API_KEY')
@@ -68,6 +133,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    POSTER_FRAME_BACKEND = 'stub'
+    STATS_ROLLUP_INTERVAL = 0
 
 class ProductionConfig(Config):
     # Production-specific configuration
@@ -79,6 +146,12 @@ class ProductionConfig(Config):
     # Use PostgreSQL in production
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI')
     
+    # Share buffered view counts across worker processes
+    VIEW_COUNTER_BACKEND = os.environ.get('VIEW_COUNTER_BACKEND', 'redis')
+    
+    # Collect orphaned uploads every six hours
+    UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL', 6 * 3600))
+    
     # Set appropriate log level
     LOG_LEVEL = 'INFO'
 
@@ -0,0 +1,75 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models.user import User
+from app.models.media import Media, TrendingScore
+
+@pytest.fixture
+def app():
+    """App on a fresh in-memory database.
+
+    No app context stays pushed, so every test request gets its own, as in production.
+    """
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.drop_all()
+
+@pytest.fixture
+def viewer_id(app):
+    with app.app_context():
+        user = User(email='viewer@example.com', username='viewer', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def client(app, viewer_id):
+    """Test client logged in as the viewer"""
+    with app.app_context():
+        uniquifier = db.session.get(User, viewer_id).fs_uniquifier
+
+    client = app.test_client()
+    # Flask-Security loads the session user by fs_uniquifier
+    with client.session_transaction() as session:
+        session['_user_id'] = uniquifier
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture
+def seed_reels(app):
+    """Seed `count` public reels, newer than any seeded before, each by its own author
+    and with a trending score above theirs. Returns the new reel ids."""
+    seeded = []
+
+    def seed(count):
+        now = datetime.utcnow()
+        with app.app_context():
+            reels = []
+            for index in range(len(seeded), len(seeded) + count):
+                author = User(email=f'author{index}@example.com', username=f'author{index}', password_hash='x')
+                reel = Media(
+                    user=author,
+                    media_type='reel',
+                    file_path=f'/static/uploads/reels/reel{index}.mp4',
+                    created_at=now + timedelta(minutes=index)
+                )
+                db.session.add(TrendingScore(media=reel, score=float(index)))
+                reels.append(reel)
+            db.session.commit()
+
+            ids = [reel.id for reel in reels]
+            seeded.extend(ids)
+            return ids
+
+    return seed
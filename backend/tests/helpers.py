@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+@contextmanager
+def count_queries(app):
+    """Collect the SQL statements the app executes inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
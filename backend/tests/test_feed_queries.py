@@ -0,0 +1,37 @@
+"""Feed pages must cost the same number of queries however many reels they hold"""
+import pytest
+from app.models.media import Media
+from app.utils.feed import serialize_media_page
+from tests.helpers import count_queries
+
+SMALL_PAGE = 1
+LARGE_PAGE = 20
+
+def test_serialize_media_page_query_budget(app, viewer_id, seed_reels):
+    counts = []
+
+    for size in (SMALL_PAGE, LARGE_PAGE):
+        ids = seed_reels(size)
+        with app.app_context():
+            reels = Media.query.filter(Media.id.in_(ids)).all()
+            with count_queries(app) as statements:
+                data = serialize_media_page(reels, viewer_id=viewer_id)
+        assert len(data) == size
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
+
+@pytest.mark.parametrize('url', ['/reels/', '/api/reels/trending'])
+def test_reel_feed_query_budget(app, client, seed_reels, url):
+    counts = []
+
+    # Each batch is newer and ranks higher than the last, so it fills the first page
+    for size in (SMALL_PAGE, LARGE_PAGE):
+        ids = seed_reels(size)
+        with count_queries(app) as statements:
+            response = client.get(url, query_string={'per_page': size})
+        assert response.status_code == 200
+        assert {reel['id'] for reel in response.get_json()['reels']} == set(ids)
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
@@ -194,7 +194,11 @@ const api = {
   
   // Reels
   reels: {
-    getReels: (page = 1) => apiRequest(`/reels?page=${page}`),
+    getReels: (cursor = null) => apiRequest(cursor ? `/reels?cursor=${encodeURIComponent(cursor)}` : '/reels'),
+    
+    getPersonalReels: (refresh = false) => apiRequest(refresh ? '/reels/for-you?refresh=1' : '/reels/for-you'),
+    
+    getPrefetchManifest: (count = 5) => apiRequest(`/reels/prefetch?count=${count}`),
     
     getReel: (reelId) => apiRequest(`/reels/${reelId}`),
     
@@ -216,7 +220,15 @@ const api = {
       method: 'DELETE',
     }),
     
-    getComments: (reelId, page = 1) => apiRequest(`/reels/${reelId}/comments?page=${page}`),
+    getComments: (reelId, cursor = null, replies = 0) => {
+      const params = new URLSearchParams();
+      if (cursor) params.set('cursor', cursor);
+      if (replies) params.set('replies', replies);
+      const query = params.toString();
+      return apiRequest(query ? `/reels/${reelId}/comments?${query}` : `/reels/${reelId}/comments`);
+    },
+    
+    getReplies: (commentId, cursor = null) => apiRequest(cursor ? `/reels/comments/${commentId}/replies?cursor=${encodeURIComponent(cursor)}` : `/reels/comments/${commentId}/replies`),
     
     addComment: (reelId, content, parentId = null) => apiRequest(`/reels/${reelId}/comments`, {
       method: 'POST',
@@ -232,7 +244,17 @@ const api = {
       body: JSON.stringify({ reason, description }),
     }),
     
-    getTrendingReels: (page = 1) => apiRequest(`/reels/trending?page=${page}`),
+    getTrendingReels: (cursor = null) => apiRequest(cursor ? `/reels/trending?cursor=${encodeURIComponent(cursor)}` : '/reels/trending'),
+  },
+  
+  // Delta sync: pass the token from the previous response to get only what changed
+  sync: {
+    getChanges: (token = null) => apiRequest(token ? `/sync?token=${encodeURIComponent(token)}` : '/sync'),
+  },
+  
+  // Notification inbox
+  notifications: {
+    getSince: (lastSeq = 0) => apiRequest(`/notifications?since=${lastSeq}`),
   },
   
   // Subscriptions